@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_manager import DataManager
+
+async def request(reader, writer, method, path, body=None):
+    content = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(content)}\r\n\r\n".encode("latin-1") + content)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def client(host, port, client_id, deadline, centers, time_slots, latencies, statuses, seed):
+    rng = random.Random(seed + client_id)
+    reader, writer = await asyncio.open_connection(host, port)
+    today = datetime.date.today()
+    count = 0
+    while time.perf_counter() < deadline:
+        day = (today + datetime.timedelta(days=rng.randint(0, 30))).strftime("%m/%d/%y")
+        email = f"load{client_id}.{count}@example.com"
+        roll = rng.random()
+        if roll < 0.5:
+            method, path, body = "POST", "/appointments", {
+                "date": day, "time": rng.choice(time_slots), "center": rng.choice(centers),
+                "name": "Load Test", "phone": "5550000000", "email": email}
+        elif roll < 0.75:
+            method, path, body = "GET", f"/appointments?email=load{client_id}.{rng.randint(0, max(count, 1))}@example.com", None
+        else:
+            method, path, body = "GET", f"/availability?start={day}", None
+
+        started = time.perf_counter()
+        status = await request(reader, writer, method, path, body)
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+        count += 1
+    writer.close()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def run(host, port, clients, duration, seed):
+    # Only the center names and time slots are needed; the manager reads an
+    # empty file of its own rather than touching the service's data.
+    with tempfile.TemporaryDirectory() as directory:
+        config = DataManager(os.path.join(directory, "config.csv"), journal=False, cache=False)
+        centers, time_slots = list(config.centers), config.time_slots
+        config.close(compact=False)
+    deadline = time.perf_counter() + duration
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, i, deadline, centers, time_slots,
+                                  latencies, statuses, seed) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+def wait_for_port(host, port, timeout=10.0):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"service did not start on {host}:{port}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load against the booking service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-c", "--clients", type=int, default=32)
+    parser.add_argument("-d", "--duration", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--external", action="store_true", help="target an already running service")
+    args = parser.parse_args()
+
+    server = None
+    directory = tempfile.TemporaryDirectory()
+    if not args.external:
+        data_file = os.path.join(directory.name, "appointments.csv")
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "service.py"), "--host", args.host,
+                                   "--port", str(args.port), "--data", data_file], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.host, args.port)
+        latencies, statuses, elapsed = asyncio.run(run(args.host, args.port, args.clients, args.duration, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        directory.cleanup()
+
+    print(f"clients: {args.clients}, requests: {len(latencies)}, elapsed: {elapsed:.2f}s")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+    print(f"latency p50: {percentile(latencies, 0.50) * 1000:.2f} ms, p99: {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print("status counts: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import gc
+import random
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_manager import DataManager, HEADER
+
+def write_roster(path, count, seed=42):
+    manager = DataManager(path, journal=False)
+    centers = list(manager.centers)
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        for i in range(count):
+            day = today + datetime.timedelta(days=rng.randint(-365, 30))
+            writer.writerow([day.strftime("%m/%d/%y").lstrip("0").replace("/0", "/"),
+                             rng.choice(manager.time_slots), rng.choice(centers),
+                             f"Person {i}", f"555{rng.randint(0, 9999999):07d}",
+                             f"person{i}@example.com"])
+
+def load_legacy(path):
+    appointments = {}
+    with open(path, "r", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        next(reader)
+        for row in reader:
+            if len(row) >= 6:
+                date, time, center, name, phone, email = row[:6]
+                key = f"{date}_{time}_{center}"
+                
+                if key not in appointments:
+                    appointments[key] = []
+                appointments[key].append({
+                    "name": name,
+                    "phone": phone,
+                    "email": email
+                })
+    return appointments
+
+def measure(load):
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per appointment held in memory")
+    parser.add_argument("-n", "--count", type=int, default=100000)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "appointments.csv")
+        write_roster(path, args.count)
+        
+        legacy = measure(lambda: load_legacy(path))
+        compact = measure(lambda: DataManager(path, journal=False))
+    
+    print(f"appointments: {args.count}")
+    print(f"legacy dict-of-dicts: {legacy / args.count:8.1f} bytes/appointment")
+    print(f"compact records:      {compact / args.count:8.1f} bytes/appointment")
+    print(f"reduction:            {100 * (1 - compact / legacy):8.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_manager import DataManager
+from suite import parse_count, write_appointments
+
+IMPORT_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+# Measured from interpreter start, so it includes every import as well as
+# loading the data and drawing the first tab.
+WINDOW_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import tkinter as tk
+import main
+root = tk.Tk()
+app = main.VaccinationScheduler(root, {data!r})
+root.update()
+print(time.perf_counter() - started)
+app.data_manager.close(compact=False)
+root.destroy()
+"""
+
+def run_script(script, repeat):
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"exit status {result.returncode}"}
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return {"median_seconds": statistics.median(timings), "runs": timings}
+
+def run_command(arguments, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(ROOT, "cli.py")] + arguments,
+                                capture_output=True, text=True)
+        timings.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1]}
+    return {"median_seconds": statistics.median(timings), "runs": timings}
+
+def report(label, result):
+    if "error" in result:
+        print(f"{label:<36} unavailable: {result['error']}")
+    else:
+        print(f"{label:<36} {result['median_seconds'] * 1000:9.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time, CLI command time and GUI time-to-first-window")
+    parser.add_argument("-n", "--rows", type=parse_count, default=parse_count("100k"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for module in ("validator", "data_manager", "cli", "main"):
+        results[f"import {module}"] = run_script(IMPORT_SCRIPT.format(root=ROOT, module=module), args.repeat)
+        report(f"import {module}", results[f"import {module}"])
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "appointments.csv")
+        config = DataManager(path, journal=False, cache=False)
+        kept = write_appointments(path, args.rows, list(config.centers), config.time_slots, keep=[0])
+        date, _, _, _, _, email = kept[0]
+        # The first run builds the snapshot cache, as a first start would.
+        DataManager(path).close(compact=False)
+        print(f"rows: {args.rows:,}")
+
+        commands = {
+            "cli search": ["--data", path, "search", email],
+            "cli list --date": ["--data", path, "list", "--date", date],
+            "cli stats --week": ["--data", path, "stats", "--week", date],
+        }
+        for label, arguments in commands.items():
+            results[label] = run_command(arguments, args.repeat)
+            report(label, results[label])
+
+        results["gui first window"] = run_script(WINDOW_SCRIPT.format(root=ROOT, data=path), args.repeat)
+        report("gui first window", results["gui first window"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"rows": args.rows, "results": results}, file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
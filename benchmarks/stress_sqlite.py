@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_manager import DataManager
+
+DATE = "12/31/30"
+TIME = "08:00"
+CENTER = "Nearest Government Clinic"
+
+def kiosk(db_file, kiosk_id, attempts, start):
+    manager = DataManager(db_file)
+    start.wait()
+    booked = 0
+    for i in range(attempts):
+        if manager.book_appointment(DATE, TIME, CENTER, f"Kiosk {kiosk_id}", "5550000000",
+                                    f"kiosk{kiosk_id}.{i}@example.com"):
+            booked += 1
+    manager.close()
+    return booked
+
+def main():
+    parser = argparse.ArgumentParser(description="Book one slot from many processes at once")
+    parser.add_argument("-p", "--processes", type=int, default=16)
+    parser.add_argument("-a", "--attempts", type=int, default=10)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, "appointments.db")
+        manager = DataManager(db_file)
+        capacity = manager.slot_capacity[CENTER]
+        manager.close()
+        
+        with multiprocessing.Manager() as sync:
+            start = sync.Event()
+            with multiprocessing.Pool(args.processes) as pool:
+                results = [pool.apply_async(kiosk, (db_file, i, args.attempts, start))
+                           for i in range(args.processes)]
+                time.sleep(0.5)
+                began = time.perf_counter()
+                start.set()
+                booked = sum(result.get() for result in results)
+                elapsed = time.perf_counter() - began
+        
+        stored = DataManager(db_file).get_filtered_appointments(DATE, CENTER)
+    
+    print(f"processes: {args.processes}, attempts each: {args.attempts}, slot capacity: {capacity}")
+    print(f"successful bookings: {booked}, rows stored: {len(stored)}, elapsed: {elapsed:.3f}s")
+    if booked != capacity or len(stored) != capacity:
+        print("FAIL: slot was overbooked or bookings were lost")
+        return 1
+    print("OK: capacity respected")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
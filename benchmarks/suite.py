@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_manager import DataManager, HEADER
+from validator import InputValidator
+from validation_benchmark import synthetic_roster
+
+# A fixed calendar keeps generated files identical from one day to the next.
+START_DATE = datetime.date(2021, 1, 4)
+DAYS = 365
+
+def parse_count(value):
+    multipliers = {"k": 1000, "m": 1000000}
+    suffix = value[-1:].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+def generate_appointments(count, centers, time_slots, seed=1234):
+    rng = random.Random(seed)
+    for i in range(count):
+        day = START_DATE + datetime.timedelta(days=rng.randrange(DAYS))
+        yield (day.strftime("%m/%d/%y"), rng.choice(time_slots), rng.choice(centers),
+               f"Person {i}", f"555{rng.randrange(10000000):07d}", f"person{i}@example.com")
+
+def write_appointments(path, count, centers, time_slots, seed=1234, keep=()):
+    # Returns the generated rows whose positions are in keep, so callers can
+    # look up known appointments without holding millions of rows.
+    keep = set(keep)
+    kept = {}
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        for i, row in enumerate(generate_appointments(count, centers, time_slots, seed)):
+            writer.writerow(row)
+            if i in keep:
+                kept[i] = row
+    return kept
+
+def timed(results, name, calls, function):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    results[name] = {"calls": calls, "seconds": elapsed, "per_call_us": elapsed / calls * 1e6}
+    print(f"{name:<30} {calls:>8} calls {elapsed:9.3f}s {elapsed / calls * 1e6:12.1f} us/call", flush=True)
+
+def run(count, seed, sample):
+    rng = random.Random(seed + 1)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "appointments.csv")
+        config = DataManager(path, journal=False, cache=False)
+        positions = [rng.randrange(count) for _ in range(sample)]
+        kept = write_appointments(path, count, list(config.centers), config.time_slots, seed, positions)
+        picks = [kept[i] for i in positions]
+
+        manager = DataManager(path)
+        timed(results, "load_appointments", 1, manager.load_appointments)
+
+        timed(results, "get_appointments_by_email", sample,
+              lambda: [manager.get_appointments_by_email(row[5]) for row in picks])
+        timed(results, "get_filtered_appointments", sample,
+              lambda: [manager.get_filtered_appointments(row[0], row[2]) for row in picks])
+        timed(results, "is_slot_available", sample,
+              lambda: [manager.is_slot_available(row[0], row[1], row[2]) for row in picks])
+        timed(results, "next_available_slot", sample,
+              lambda: [manager.next_available_slot(row[0], centers=[row[2]]) for row in picks])
+
+        # Every add and cancel is journaled and synced, so fewer of them run.
+        writes = picks[:max(1, sample // 10)]
+        timed(results, "add_appointment", len(writes),
+              lambda: [manager.add_appointment(date, time, center, name, phone, "new." + email)
+                       for date, time, center, name, phone, email in writes])
+        timed(results, "cancel_appointment", len(writes),
+              lambda: [manager.cancel_appointment(date, time, center, email)
+                       for date, time, center, _, _, email in writes])
+
+        timed(results, "save_appointments", 1, manager.save_appointments)
+        timed(results, "export_report", 1,
+              lambda: manager.export_report(os.path.join(directory, "report.csv")))
+        timed(results, "export_analytics", 1,
+              lambda: manager.export_analytics(os.path.join(directory, "analytics.json")))
+        manager.close()
+
+    forms = synthetic_roster(sample * 10, seed)
+    timed(results, "validate_appointment_form", len(forms),
+          lambda: [InputValidator.validate_appointment_form(name, phone, email) for name, phone, email in forms])
+    return results
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'operation':<30} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<30} {'-':>12} {current['per_call_us']:12.1f} {'new':>8}")
+            continue
+        change = current["per_call_us"] / before["per_call_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<30} {before['per_call_us']:12.1f} {current['per_call_us']:12.1f} {change:+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time DataManager and validator operations on synthetic data")
+    parser.add_argument("-n", "--rows", type=parse_count, default=parse_count("10k"),
+                        help="appointments to generate, e.g. 10k, 500k or 5M")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--sample", type=int, default=1000, help="lookups per read operation")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operation; the fastest is kept")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="slowdown per call that counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print(f"rows: {args.rows:,}  seed: {args.seed}")
+    results = {}
+    for _ in range(max(1, args.repeat)):
+        for name, result in run(args.rows, args.seed, args.sample).items():
+            if name not in results or result["seconds"] < results[name]["seconds"]:
+                results[name] = result
+    report = {
+        "rows": args.rows,
+        "seed": args.seed,
+        "sample": args.sample,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("rows") != args.rows:
+            print(f"warning: baseline was run with {baseline.get('rows'):,} rows")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
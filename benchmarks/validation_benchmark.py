@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import re
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validator import InputValidator
+
+FIRST_NAMES = ["Anna", "José", "Li", "Mary-Jane", "O'Brien", "Ravi", "Zoë", "Ahmed"]
+LAST_NAMES = ["Smith", "García", "Nambiar", "Chen", "St. John", "Okafor"]
+
+def synthetic_roster(count, seed=7):
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        phone = f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+        email = f"person{i}@example.com"
+        
+        # Roughly one row in twenty carries a typo somewhere.
+        roll = rng.random()
+        if roll < 0.02:
+            name = name + "1"
+        elif roll < 0.035:
+            phone = phone[:6]
+        elif roll < 0.05:
+            email = email.replace("@", "")
+        records.append((name, phone, email))
+    return records
+
+def original_validate_appointment_form(name, phone, email):
+    # The per-form validation as it was before the rules were precompiled,
+    # kept here as the baseline both faster paths are measured against.
+    errors = []
+    name = name.strip()
+    if not name:
+        errors.append("Name cannot be empty")
+    elif len(name) < 2:
+        errors.append("Name is too short")
+    elif not all(c.isalpha() or c.isspace() or c in ".-'" for c in name):
+        errors.append("Name contains invalid characters")
+
+    phone = phone.strip()
+    if not phone:
+        errors.append("Phone number cannot be empty")
+    else:
+        cleaned_phone = re.sub(r'[\s\-\(\)\.]+', '', phone)
+        if not cleaned_phone.isdigit():
+            errors.append("Phone number should contain only digits, spaces, and common separators")
+        elif len(cleaned_phone) < 10:
+            errors.append("Phone number is too short")
+
+    email = email.strip()
+    if not email:
+        errors.append("Email cannot be empty")
+    elif not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        errors.append("Invalid email format")
+
+    return (len(errors) == 0, errors)
+
+def timed(label, function, count):
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed:7.2f}s  {count / elapsed:12,.0f} rows/s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batch validation with per-form validation")
+    parser.add_argument("-n", "--count", type=int, default=1000000)
+    parser.add_argument("-p", "--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    
+    records = synthetic_roster(args.count)
+    print(f"rows: {args.count}")
+    
+    original = timed("original per-form loop", lambda: [
+        original_validate_appointment_form(name, phone, email) for name, phone, email in records], args.count)
+    looped = timed("validate_appointment_form loop", lambda: [
+        InputValidator.validate_appointment_form(name, phone, email) for name, phone, email in records], args.count)
+    batched = timed("validate_many", lambda: InputValidator.validate_many(records), args.count)
+    pooled = timed(f"validate_many, {args.processes} processes",
+                   lambda: InputValidator.validate_many(records, processes=args.processes), args.count)
+    
+    if not original == looped == batched == pooled:
+        print("FAIL: results differ between validation paths")
+        return 1
+    print(f"invalid rows: {sum(1 for valid, _ in batched if not valid)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import sys
+import csv
+import json
+import argparse
+from data_manager import DataManager, ExportError, HEADER, parse_date
+from validator import InputValidator
+
+def write_rows(rows):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(HEADER)
+    for date, time, center, person in rows:
+        writer.writerow([date, time, center, person["name"], person["phone"], person["email"]])
+
+def book(manager, args):
+    is_valid, errors = InputValidator.validate_appointment_form(args.name, args.phone, args.email)
+    if not is_valid:
+        print("; ".join(errors), file=sys.stderr)
+        return 1
+
+    if args.earliest:
+        centers = [args.center] if args.center else None
+        times = [args.time] if args.time else None
+        slot = manager.next_available_slot(args.date, centers=centers, times=times)
+        if slot is None:
+            print("No free slot in the next 30 days", file=sys.stderr)
+            return 1
+        date, time, center = slot
+    else:
+        if not (args.date and args.time and args.center):
+            print("--date, --time and --center are required unless --earliest is given", file=sys.stderr)
+            return 2
+        date, time, center = args.date, args.time, args.center
+    if center not in manager.centers or time not in manager.time_slots:
+        print(f"Unknown center or time slot: {center} {time}", file=sys.stderr)
+        return 2
+
+    if not manager.book_appointment(date, time, center, args.name.strip(), args.phone.strip(), args.email.strip()):
+        print("This time slot is no longer available", file=sys.stderr)
+        return 1
+    print(f"Booked {date} {time} at {center}")
+    return 0
+
+def cancel(manager, args):
+    if not manager.cancel_appointment(args.date, args.time, args.center, args.email):
+        print("Appointment not found", file=sys.stderr)
+        return 1
+    print("Appointment cancelled")
+    return 0
+
+def search(manager, args):
+    write_rows(manager.get_appointments_by_email(args.email, args.archived))
+    return 0
+
+def list_appointments(manager, args):
+    if args.date:
+        rows = manager.get_filtered_appointments(args.date, args.center, args.archived)
+    else:
+        rows = manager.iter_appointments(args.start, args.end, args.center, args.archived)
+    write_rows(rows)
+    return 0
+
+def stats(manager, args):
+    if args.week:
+        report = manager.week_utilization(args.week, args.center, args.archived)
+    else:
+        report = manager.utilization(args.start, args.end, args.center, args.archived)
+
+    if args.json:
+        report["daily"] = {day.isoformat(): centers for day, centers in report["daily"].items()}
+        print(json.dumps(report, default=str, indent=2))
+        return 0
+
+    print(f"{report['start']} to {report['end']}: {report['booked']} booked, "
+          f"{report['utilization']:.1%} of {report['capacity']}")
+    for name, center in report["centers"].items():
+        print(f"  {name}: {center['booked']} booked, {center['utilization']:.1%} of {center['capacity']}")
+    return 0
+
+def export(manager, args):
+    try:
+        filenames = manager.export_report(args.filename, args.date, args.center, args.start, args.end,
+                                          compress=args.gzip or None, split_by_center=args.split,
+                                          include_archived=args.archived)
+    except ExportError as error:
+        print(error, file=sys.stderr)
+        return 1
+    for filename in filenames:
+        print(filename)
+    return 0
+
+def report(manager, args):
+    try:
+        filenames = manager.export_analytics(args.filename, args.start, args.end, not args.current,
+                                             args.processes, compress=args.gzip or None)
+    except ExportError as error:
+        print(error, file=sys.stderr)
+        return 1
+    for filename in filenames:
+        print(filename)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Book, cancel, search and report on vaccination appointments")
+    parser.add_argument("--data", default="appointments.csv", help="CSV file, data directory or SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("book", help="book an appointment")
+    command.add_argument("--date")
+    command.add_argument("--time")
+    command.add_argument("--center")
+    command.add_argument("--earliest", action="store_true",
+                         help="book the earliest free slot from --date (default today), within --center/--time if given")
+    command.add_argument("name")
+    command.add_argument("phone")
+    command.add_argument("email")
+    command.set_defaults(handler=book)
+
+    command = commands.add_parser("cancel", help="cancel an appointment")
+    for field in ("date", "time", "center", "email"):
+        command.add_argument(field)
+    command.set_defaults(handler=cancel)
+
+    command = commands.add_parser("search", help="list appointments for an email address")
+    command.add_argument("email")
+    command.add_argument("--archived", action="store_true")
+    command.set_defaults(handler=search)
+
+    command = commands.add_parser("list", help="list appointments as CSV")
+    command.add_argument("--date")
+    command.add_argument("--start")
+    command.add_argument("--end")
+    command.add_argument("--center")
+    command.add_argument("--archived", action="store_true")
+    command.set_defaults(handler=list_appointments)
+
+    command = commands.add_parser("stats", help="bookings and utilization for a date range")
+    command.add_argument("--start")
+    command.add_argument("--end")
+    command.add_argument("--week", help="the week containing this date")
+    command.add_argument("--center")
+    command.add_argument("--archived", action="store_true")
+    command.add_argument("--json", action="store_true")
+    command.set_defaults(handler=stats)
+
+    command = commands.add_parser("export", help="write a CSV report")
+    command.add_argument("filename")
+    command.add_argument("--date")
+    command.add_argument("--start")
+    command.add_argument("--end")
+    command.add_argument("--center")
+    command.add_argument("--gzip", action="store_true")
+    command.add_argument("--split", action="store_true", help="one file per center")
+    command.add_argument("--archived", action="store_true")
+    command.set_defaults(handler=export)
+
+    command = commands.add_parser("report", help="write analytics pivots over the whole stored history")
+    command.add_argument("filename", help="a .json file, or a CSV base name for one file per pivot")
+    command.add_argument("--start")
+    command.add_argument("--end")
+    command.add_argument("--processes", type=int, help="worker processes (default: aggregate in this process)")
+    command.add_argument("--current", action="store_true", help="leave out archived months")
+    command.add_argument("--gzip", action="store_true")
+    command.set_defaults(handler=report)
+    return parser
+
+def check_arguments(manager, args):
+    # Dates and the center are checked up front, so a typo is reported
+    # instead of being booked or surfacing as a traceback.
+    for field in ("date", "start", "end", "week"):
+        value = getattr(args, field, None)
+        if value:
+            parse_date(value)
+    center = getattr(args, "center", None)
+    if center is not None and center not in manager.centers:
+        raise ValueError(f"Unknown center: {center}")
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "stats" and not (args.start or args.week):
+        print("stats needs --start or --week", file=sys.stderr)
+        return 2
+
+    # Like the GUI, only the last 30 days are indexed up front; older
+    # history is loaded if a command reaches back that far.
+    manager = DataManager(args.data, history_days=30)
+    try:
+        check_arguments(manager, args)
+        return args.handler(manager, args)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 2
+    finally:
+        # Changes are already journaled; the snapshot is rewritten only when
+        # the journal has grown past its limit.
+        manager.close(compact=False)
+
+if __name__ == "__main__":
+    sys.exit(main())
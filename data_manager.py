@@ -1,11 +1,70 @@
 import os
 import csv
+import gzip
+import json
+import bisect
+import datetime
+import collections
+from dates import parse_date
+from reports import DAY_HEADER, DOMAIN_HEADER, SLOT_HEADER, TIMING_HEADER, build_analytics
+from storage import HEADER, OP_ADD, OP_CANCEL, ArchiveStorage, open_storage
+
+EXPORT_BUFFER_SIZE = 1024 * 1024
+
+def center_report_filename(filename, center):
+    for extension in (".csv.gz", ".csv", ".gz"):
+        if filename.endswith(extension):
+            base = filename[:-len(extension)]
+            break
+    else:
+        base, extension = os.path.splitext(filename)
+    slug = "".join(c if c.isalnum() else "_" for c in center).strip("_")
+    return f"{base}_{slug}{extension}"
+
+class ExportError(Exception):
+    pass
+
+class Appointment:
+    
+    # Name and phone share one string; the email stays separate so the email
+    # index can use it directly as its key.
+    __slots__ = ("day", "time", "center", "email", "_contact")
+    
+    PERSON_FIELDS = ("name", "phone", "email")
+    
+    def __init__(self, day, time, center, name, phone, email):
+        self.day = day
+        self.time = time
+        self.center = center
+        self.email = email
+        self._contact = f"{name}\x1f{phone}"
+    
+    @property
+    def name(self):
+        return self._contact.partition("\x1f")[0]
+    
+    @property
+    def phone(self):
+        return self._contact.partition("\x1f")[2]
+    
+    def __getitem__(self, field):
+        if field not in self.PERSON_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+    
+    def __repr__(self):
+        return f"Appointment(name={self.name!r}, phone={self.phone!r}, email={self.email!r})"
 
 class DataManager:
     
-    def __init__(self, data_file="appointments.csv"):
+    def __init__(self, data_file="appointments.csv", journal=True, journal_limit=1024 * 1024, storage=None,
+                 history_days=None, cache=True, metrics=None, query_cache_size=256):
         self.data_file = data_file
-        self.appointments = {}
+        self.storage = storage if storage is not None else open_storage(data_file, journal, journal_limit, cache)
+        self.history_days = history_days
+        self.query_cache_size = query_cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
         
         self.centers = {
             "Nearest Government Hospital": {
@@ -25,107 +84,690 @@ class DataManager:
         self.time_slots = ["08:00", "09:00", "10:00", "11:00", "12:00", 
                           "13:00", "14:00", "15:00", "16:00"]
         
+        self._center_names = []
+        self._center_codes = {}
+        self._time_names = []
+        self._time_codes = {}
+        for center in self.centers:
+            self._intern(center, self._center_names, self._center_codes)
+        for time in self.time_slots:
+            self._intern(time, self._time_names, self._time_codes)
+        
+        self.slot_capacity = {center: details["capacity"] // len(self.time_slots)
+                              for center, details in self.centers.items()}
+        self._capacity_by_code = [self.slot_capacity[center] for center in self._center_names]
+        
+        if metrics is not None:
+            metrics.instrument_data_manager(self)
         self.load_appointments()
     
+    def _reset(self):
+        self._days = {}
+        self._day_list = []
+        self._day_codes = {}
+        self._date_labels = {}
+        self.email_index = {}
+        self._occupancy = {}
+        self._day_counts = {}
+        self._full = {}
+        self._query_cache = collections.OrderedDict()
+        self._cache_deps = {}
+        self.count = 0
+        self._history_cutoff = None
+        self._history_rows = []
+        self._archive = None
+    
+    def _intern(self, value, names, codes):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(value)
+        return code
+    
+    def _day_code(self, date):
+        day = self._day_codes.get(date)
+        if day is None:
+            try:
+                day = parse_date(date).toordinal()
+            except ValueError:
+                # Unparseable legacy dates still round-trip; they sort first.
+                day = -len(self._day_codes) - 1
+            self._day_codes[date] = day
+            self._date_labels.setdefault(day, date)
+        return day
+    
+    def _find_day(self, date):
+        day = self._day_codes.get(date)
+        if day is None:
+            try:
+                day = parse_date(date).toordinal()
+            except ValueError:
+                return None
+        return day
+    
+    def _booked(self, day, center_code, time_code):
+        counts = self._occupancy.get(day, {}).get(center_code)
+        if counts is None or time_code is None or time_code >= len(counts):
+            return 0
+        return counts[time_code]
+    
     def load_appointments(self):
-        appointments = {}
-        if os.path.exists(self.data_file):
-            with open(self.data_file, "r", encoding="utf-8") as file:
-                reader = csv.reader(file)
-                next(reader)  
-                for row in reader:
-                    if len(row) >= 6: 
-                        date, time, center, name, phone, email = row[:6]
-                        key = f"{date}_{time}_{center}"
-                        
-                        if key not in appointments:
-                            appointments[key] = []
-                        appointments[key].append({
-                            "name": name,
-                            "phone": phone,
-                            "email": email
-                        })
-        
-        self.appointments = appointments
-        return appointments
+        self._reset()
+        if self.history_days is not None:
+            self._history_cutoff = datetime.date.today().toordinal() - self.history_days
+        
+        for op, row in self.storage.load():
+            self._replay(op, row)
+        
+        return self.count + len(self._history_rows)
+    
+    def _replay(self, op, row):
+        # With history_days set, rows older than the cutoff are kept unindexed
+        # until a query reaches back that far.
+        if op == OP_ADD:
+            if self._history_cutoff is not None and self._day_code(row[0]) < self._history_cutoff:
+                self._history_rows.append(tuple(row))
+            else:
+                self._apply_add(*row)
+        elif op == OP_CANCEL:
+            self._touch(row[0])
+            self._apply_cancel(*row)
+    
+    def refresh(self):
+        # Applies what other instances changed since the last load or refresh
+        # and returns those changes, or None after falling back to a full load.
+        changes = self.storage.read_changes()
+        if changes is None:
+            self.load_appointments()
+            return None
+        for op, row in changes:
+            self._replay(op, row)
+        return changes
+    
+    def _load_history(self):
+        if self._history_cutoff is None:
+            return
+        rows, self._history_rows = self._history_rows, []
+        self._history_cutoff = None
+        for row in rows:
+            self._apply_add(*row)
+    
+    def _load_archive(self):
+        # Archived records get an index of their own, so queries that leave
+        # them out never see them.
+        if self._archive is None:
+            self._archive = DataManager(self.data_file, storage=ArchiveStorage(self.storage), query_cache_size=0)
+    
+    def _reach(self, start_date, include_archived=False):
+        if include_archived:
+            self._load_archive()
+        if start_date is None:
+            self._load_history()
+        else:
+            self._touch(start_date)
+    
+    def _touch(self, date):
+        if self._history_cutoff is not None:
+            day = self._find_day(date)
+            if day is None or day < self._history_cutoff:
+                self._load_history()
+    
+    def iter_rows(self):
+        yield from self._history_rows
+        for day in self._day_list:
+            for date, time, center, person in self._iter_day(day, None):
+                yield (date, time, center, person.name, person.phone, person.email)
     
     def save_appointments(self):
-        with open(self.data_file, "w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(["Date", "Time", "Center", "Name", "Phone", "Email"])
-            
-            for key, people in self.appointments.items():
-                date, time, center = key.split("_")
-                for person in people:
-                    writer.writerow([date, time, center, person["name"], 
-                                   person["phone"], person["email"]])
+        self.storage.save(self.iter_rows())
     
-    def add_appointment(self, date, time, center, name, phone, email):
-        key = f"{date}_{time}_{center}"
+    def _compact_if_needed(self):
+        if self.storage.needs_compaction:
+            self.save_appointments()
+    
+    def _apply_add(self, date, time, center, name, phone, email):
+        day = self._day_code(date)
+        center_code = self._intern(center, self._center_names, self._center_codes)
+        time_code = self._intern(time, self._time_names, self._time_codes)
         
-        if key not in self.appointments:
-            self.appointments[key] = []
+        centers = self._days.get(day)
+        if centers is None:
+            centers = self._days[day] = {}
+            bisect.insort(self._day_list, day)
+        times = centers.setdefault(center_code, {})
+        people = times.get(time_code)
+        if people is None:
+            people = times[time_code] = []
+            # Keep each center's time buckets in slot order so queries never sort.
+            if len(times) > 1 and time_code < list(times)[-2]:
+                centers[center_code] = dict(sorted(times.items()))
         
-        self.appointments[key].append({
-            "name": name,
-            "phone": phone,
-            "email": email
-        })
+        person = Appointment(day, time_code, center_code, name, phone, email)
+        self._invalidate(day, center, email)
+        people.append(person)
+        self._index_email(person)
+        self.count += 1
         
-        self.save_appointments()
+        occupancy = self._occupancy.setdefault(day, {})
+        counts = occupancy.get(center_code)
+        if counts is None:
+            counts = occupancy[center_code] = [0] * len(self._time_names)
+        elif time_code >= len(counts):
+            counts.extend([0] * (len(self._time_names) - len(counts)))
+        counts[time_code] += 1
+        self._count_day(day, center_code, 1)
+        if time_code < len(self.time_slots) and center_code < len(self.centers):
+            if counts[time_code] >= self._capacity_by_code[center_code]:
+                self._full[day] = self._full.get(day, 0) | 1 << self._slot_bit(center_code, time_code)
+    
+    def _slot_bit(self, center_code, time_code):
+        # Bits run through the centers of one time slot before the next slot,
+        # so the lowest free bit of a day is its earliest free slot.
+        return time_code * len(self.centers) + center_code
+    
+    def _count_day(self, day, center_code, delta):
+        # Per-day totals by center, kept alongside the per-slot occupancy so
+        # rollups never have to sum slots or scan appointments.
+        totals = self._day_counts.get(day)
+        if totals is None:
+            totals = self._day_counts[day] = [0] * len(self._center_names)
+        elif center_code >= len(totals):
+            totals.extend([0] * (len(self._center_names) - len(totals)))
+        totals[center_code] += delta
+    
+    def _index_email(self, person):
+        folded = person.email.casefold()
+        if folded == person.email:
+            folded = person.email
+        
+        # Most emails book once, so a lone record is stored without a list.
+        entry = self.email_index.get(folded)
+        if entry is None:
+            self.email_index[folded] = person
+        elif isinstance(entry, Appointment):
+            self.email_index[folded] = [entry, person]
+        else:
+            entry.append(person)
+    
+    def _unindex_email(self, folded, person):
+        entry = self.email_index[folded]
+        if entry is person:
+            del self.email_index[folded]
+        else:
+            entry.remove(person)
+            if len(entry) == 1:
+                self.email_index[folded] = entry[0]
+    
+    def _email_matches(self, email):
+        entry = self.email_index.get(email.strip().casefold())
+        if entry is None:
+            return ()
+        if isinstance(entry, Appointment):
+            return (entry,)
+        return tuple(entry)
+    
+    def _apply_cancel(self, date, time, center, email):
+        day = self._find_day(date)
+        center_code = self._center_codes.get(center)
+        time_code = self._time_codes.get(time)
+        
+        for person in self._email_matches(email):
+            if (person.day == day and person.time == time_code and person.center == center_code
+                    and person.email == email):
+                self._unindex_email(email.casefold(), person)
+                self._invalidate(day, center, email)
+                
+                centers = self._days[day]
+                times = centers[center_code]
+                people = times[time_code]
+                people.remove(person)
+                if not people:
+                    del times[time_code]
+                    if not times:
+                        del centers[center_code]
+                        if not centers:
+                            del self._days[day]
+                            del self._day_list[bisect.bisect_left(self._day_list, day)]
+                self.count -= 1
+                counts = self._occupancy[day][center_code]
+                counts[time_code] -= 1
+                self._count_day(day, center_code, -1)
+                if (day in self._full and center_code < len(self.centers)
+                        and counts[time_code] < self._capacity_by_code[center_code]):
+                    self._full[day] &= ~(1 << self._slot_bit(center_code, time_code))
+                return True
+        return False
+    
+    def _row(self, person):
+        return (self._date_labels[person.day], self._time_names[person.time],
+                self._center_names[person.center], person)
+    
+    def add_appointment(self, date, time, center, name, phone, email):
+        self._touch(date)
+        row = (date, time, center, name, phone, email)
+        self.storage.add(row)
+        self._apply_add(*row)
+        self._compact_if_needed()
+    
+    def book_appointment(self, date, time, center, name, phone, email):
+        self._touch(date)
+        row = (date, time, center, name, phone, email)
+        if not self.storage.book(row, self.slot_capacity[center], self.booked_count(date, time, center)):
+            return False
+        self._apply_add(*row)
+        self._compact_if_needed()
+        return True
+    
+    def add_appointments_bulk(self, rows, enforce_capacity=True):
+        rows = [tuple(row) for row in rows]
+        for row in rows:
+            self._touch(row[0])
+        if enforce_capacity:
+            capacities = [self.slot_capacity[row[2]] for row in rows]
+            booked = [self.booked_count(*row[:3]) for row in rows]
+            accepted = self.storage.book_many(rows, capacities, booked)
+        else:
+            self.storage.add_many(rows)
+            accepted = [True] * len(rows)
+        
+        for row, ok in zip(rows, accepted):
+            if ok:
+                self._apply_add(*row)
+        self._compact_if_needed()
+        return accepted
         
     def cancel_appointment(self, date, time, center, email):
-        key = f"{date}_{time}_{center}"
-        if key in self.appointments:
-            for i, person in enumerate(self.appointments[key]):
-                if person["email"] == email:
-                    self.appointments[key].pop(i)
-                    if not self.appointments[key]:  
-                        del self.appointments[key]
-                    self.save_appointments()
-                    return True
+        self._touch(date)
+        found = self._apply_cancel(date, time, center, email)
+        if not found and self._archive is not None and self._archive._apply_cancel(date, time, center, email):
+            self._invalidate(self._find_day(date), center, email)
+            found = True
+        
+        # A shared database may hold a booking made by another kiosk that this
+        # process has not loaded.
+        if found or self.storage.shared:
+            removed = self.storage.cancel((date, time, center, email))
+            self._compact_if_needed()
+            return found or removed
         return False
     
-    def get_appointments_by_email(self, email):
-        results = []
-        for key, people in self.appointments.items():
-            date, time, center = key.split("_")
-            for person in people:
-                if person["email"].lower() == email.lower():
-                    results.append((date, time, center, person))
-        return results
-    
-    def get_filtered_appointments(self, date=None, center=None):
-        results = []
-        for key, people in self.appointments.items():
-            key_date, key_time, key_center = key.split("_")
-            
-            if (date is None or key_date == date) and (center is None or key_center == center):
+    def close(self, compact=True):
+        # Every change is already journaled; compacting on close only keeps
+        # the next startup short, so short-lived callers may skip it.
+        if compact:
+            self.save_appointments()
+        self.storage.close()
+    
+    def _cached(self, key):
+        entry = self._query_cache.get(key)
+        if entry is None:
+            self.cache_misses += 1
+            return None
+        self._query_cache.move_to_end(key)
+        self.cache_hits += 1
+        return entry[0]
+    
+    def _remember(self, key, result, deps):
+        if self.query_cache_size <= 0:
+            return
+        self._query_cache[key] = (result, deps)
+        for dep in deps:
+            self._cache_deps.setdefault(dep, set()).add(key)
+        if len(self._query_cache) > self.query_cache_size:
+            self._forget(next(iter(self._query_cache)))
+    
+    def _forget(self, key):
+        _, deps = self._query_cache.pop(key)
+        for dep in deps:
+            keys = self._cache_deps.get(dep)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._cache_deps[dep]
+    
+    def _invalidate(self, day, center, email):
+        # A change at one date, center and email evicts only the cached
+        # queries that could include it: that date for that center or for all
+        # centers, and that email.
+        if not self._query_cache:
+            return
+        for dep in ((day, center), (day, None), email.casefold()):
+            for key in list(self._cache_deps.get(dep, ())):
+                self._forget(key)
+    
+    def cache_stats(self):
+        return {"hits": self.cache_hits, "misses": self.cache_misses,
+                "entries": len(self._query_cache), "capacity": self.query_cache_size}
+    
+    def get_appointments_by_email(self, email, include_archived=False):
+        self._reach(None, include_archived)
+        folded = email.strip().casefold()
+        key = ("email", folded, include_archived)
+        rows = self._cached(key)
+        if rows is None:
+            rows = [self._row(person) for person in self._email_matches(email)]
+            if include_archived:
+                rows = self._archive.get_appointments_by_email(email) + rows
+            self._remember(key, rows, (folded,))
+        return list(rows)
+    
+    def get_filtered_appointments(self, date=None, center=None, include_archived=False):
+        if date is None:
+            return self.get_appointments_in_range(None, None, center, include_archived)
+        
+        self._reach(date, include_archived)
+        day = self._find_day(date)
+        if day is None:
+            return []
+        key = ("filtered", day, center, include_archived)
+        rows = self._cached(key)
+        if rows is None:
+            rows = list(self._iter_day(day, center))
+            if include_archived:
+                rows = list(self._archive._iter_day(day, center)) + rows
+            self._remember(key, rows, ((day, center),))
+        return list(rows)
+    
+    def get_appointments_in_range(self, start_date=None, end_date=None, center=None, include_archived=False):
+        return list(self.iter_appointments(start_date, end_date, center, include_archived))
+    
+    def _iter_day(self, day, center):
+        centers = self._days.get(day)
+        if not centers:
+            return
+        date = self._date_labels[day]
+        
+        if center is not None:
+            center_code = self._center_codes.get(center)
+            for time_code, people in centers.get(center_code, {}).items():
+                time = self._time_names[time_code]
                 for person in people:
-                    results.append((key_date, key_time, key_center, person))
+                    yield (date, time, center, person)
+            return
         
-        results.sort(key=lambda x: (x[0], x[1]))
-        return results
+        center_codes = sorted(centers)
+        for time_code in sorted({code for times in centers.values() for code in times}):
+            time = self._time_names[time_code]
+            for center_code in center_codes:
+                for person in centers[center_code].get(time_code, ()):
+                    yield (date, time, self._center_names[center_code], person)
+    
+    def booked_count(self, date, time, center):
+        self._touch(date)
+        return self._booked(self._find_day(date), self._center_codes[center], self._time_codes.get(time))
     
     def is_slot_available(self, date, time, center):
-        key = f"{date}_{time}_{center}"
-        center_capacity = self.centers[center]["capacity"] // len(self.time_slots)
+        center_capacity = self.slot_capacity[center]
         
-        if key in self.appointments and len(self.appointments[key]) >= center_capacity:
-            return False
-        return True
+        return self.booked_count(date, time, center) < center_capacity
     
-    def export_report(self, filename, date=None, center=None):
-        appointments = self.get_filtered_appointments(date, center)
+    def availability(self, start_date, end_date=None, center=None):
+        start = parse_date(start_date)
+        end = start if end_date is None else parse_date(end_date)
+        self._touch(start)
+        centers = list(self.centers) if center is None else [center]
+        
+        # The cached grid is shared between callers, who only read it.
+        key = ("availability", start.toordinal(), end.toordinal(), center)
+        grid = self._cached(key)
+        if grid is not None:
+            return grid
         
+        grid = {}
+        for day in range(start.toordinal(), end.toordinal() + 1):
+            occupancy = self._occupancy.get(day, {})
+            day_grid = {}
+            for name in centers:
+                capacity = self.slot_capacity[name]
+                counts = occupancy.get(self._center_codes[name], ())
+                day_grid[name] = {time: max(capacity - (counts[i] if i < len(counts) else 0), 0)
+                                  for i, time in enumerate(self.time_slots)}
+            grid[datetime.date.fromordinal(day)] = day_grid
+        self._remember(key, grid, [(day, name) for day in range(start.toordinal(), end.toordinal() + 1)
+                                   for name in centers])
+        return grid
+    
+    def _date_label(self, day):
+        label = self._date_labels.get(day)
+        if label is None:
+            date = datetime.date.fromordinal(day)
+            label = f"{date.month}/{date.day}/{date:%y}"
+        return label
+    
+    def _slot_mask(self, centers=None, times=None):
         try:
-            with open(filename, "w", newline="", encoding="utf-8") as file:
+            center_codes = (range(len(self.centers)) if centers is None
+                            else [self._center_codes[center] for center in centers])
+            time_codes = (range(len(self.time_slots)) if times is None
+                          else [self._time_codes[time] for time in times])
+        except KeyError as error:
+            raise ValueError(f"Unknown center or time slot: {error.args[0]}") from None
+        mask = 0
+        for time_code in time_codes:
+            for center_code in center_codes:
+                mask |= 1 << self._slot_bit(center_code, time_code)
+        return mask
+    
+    def next_available_slot(self, start_date=None, days=30, centers=None, times=None):
+        start = datetime.date.today() if start_date is None else parse_date(start_date)
+        self._touch(start)
+        mask = self._slot_mask(centers, times)
+        first = start.toordinal()
+        for day in range(first, first + days + 1):
+            free = mask & ~self._full.get(day, 0)
+            if free:
+                time_code, center_code = divmod((free & -free).bit_length() - 1, len(self.centers))
+                return (self._date_label(day), self.time_slots[time_code], self._center_names[center_code])
+        return None
+    
+    def allocate_waitlist(self, waitlist, start_date=None, days=30):
+        # Each entry is (name, phone, email) optionally followed by the allowed
+        # centers and time slots; None allows any. People are placed in list
+        # order into their earliest free slot, and everyone placed is booked
+        # with one add_appointments_bulk call.
+        start = datetime.date.today() if start_date is None else parse_date(start_date)
+        self._touch(start)
+        first = start.toordinal()
+        last = first + days
+        full = {day: self._full.get(day, 0) for day in range(first, last + 1)}
+        taken = {}
+        masks = {}
+        rows = []
+        placements = []
+        
+        for name, phone, email, *preferences in waitlist:
+            centers = preferences[0] if len(preferences) > 0 else None
+            times = preferences[1] if len(preferences) > 1 else None
+            key = (None if centers is None else tuple(centers), None if times is None else tuple(times))
+            entry = masks.get(key)
+            if entry is None:
+                # Slots only fill up during a run, so each preference resumes
+                # from the first day that still had room.
+                entry = masks[key] = [self._slot_mask(centers, times), first]
+            mask, day = entry
+            while day <= last and not mask & ~full[day]:
+                day += 1
+            entry[1] = day
+            if day > last:
+                placements.append(None)
+                continue
+            
+            free = mask & ~full[day]
+            bit = (free & -free).bit_length() - 1
+            time_code, center_code = divmod(bit, len(self.centers))
+            count = taken.get((day, bit))
+            if count is None:
+                count = self._booked(day, center_code, time_code)
+            taken[(day, bit)] = count + 1
+            if count + 1 >= self._capacity_by_code[center_code]:
+                full[day] |= 1 << bit
+            rows.append((self._date_label(day), self.time_slots[time_code], self._center_names[center_code],
+                         name, phone, email))
+            placements.append(len(rows) - 1)
+        
+        accepted = self.add_appointments_bulk(rows)
+        return [None if index is None or not accepted[index] else rows[index][:3] for index in placements]
+    
+    def utilization(self, start_date, end_date=None, center=None, include_archived=False):
+        start = parse_date(start_date)
+        end = start if end_date is None else parse_date(end_date)
+        if end < start:
+            raise ValueError(f"End date {end} is before start date {start}")
+        self._reach(start, include_archived)
+        names = list(self.centers) if center is None else [center]
+        span = end.toordinal() - start.toordinal() + 1
+        
+        booked = {name: 0 for name in names}
+        slots = {name: [0] * len(self.time_slots) for name in names}
+        daily = {}
+        for source in (self, self._archive) if include_archived else (self,):
+            for day in source._days_between(start, end):
+                totals = source._day_counts.get(day, ())
+                occupancy = source._occupancy.get(day, {})
+                day_row = daily.setdefault(datetime.date.fromordinal(day), {name: 0.0 for name in names})
+                for name in names:
+                    center_code = source._center_codes[name]
+                    count = totals[center_code] if center_code < len(totals) else 0
+                    booked[name] += count
+                    day_row[name] += count / self.centers[name]["capacity"]
+                    counts = occupancy.get(center_code, ())
+                    slot_counts = slots[name]
+                    for i in range(min(len(counts), len(slot_counts))):
+                        slot_counts[i] += counts[i]
+        if include_archived:
+            daily = dict(sorted(daily.items()))
+        
+        centers = {}
+        for name in names:
+            capacity = self.centers[name]["capacity"] * span
+            slot_capacity = self.slot_capacity[name] * span
+            centers[name] = {
+                "booked": booked[name],
+                "capacity": capacity,
+                "utilization": booked[name] / capacity if capacity else 0.0,
+                "slots": {time: {"booked": count, "utilization": count / slot_capacity if slot_capacity else 0.0}
+                          for time, count in zip(self.time_slots, slots[name])},
+            }
+        total = sum(booked.values())
+        capacity = sum(details["capacity"] for details in centers.values())
+        return {
+            "start": start,
+            "end": end,
+            "booked": total,
+            "capacity": capacity,
+            "utilization": total / capacity if capacity else 0.0,
+            "centers": centers,
+            "daily": daily,
+        }
+    
+    def day_utilization(self, date, center=None, include_archived=False):
+        return self.utilization(date, date, center, include_archived)
+    
+    def week_utilization(self, date, center=None, include_archived=False):
+        monday = parse_date(date) - datetime.timedelta(days=parse_date(date).weekday())
+        return self.utilization(monday, monday + datetime.timedelta(days=6), center, include_archived)
+    
+    def iter_appointments(self, start_date=None, end_date=None, center=None, include_archived=False):
+        # Loading history happens here, before the caller starts iterating,
+        # so export threads only ever read the index.
+        self._reach(start_date, include_archived)
+        days = self._days_between(start_date, end_date)
+        if not include_archived:
+            return self._iter_days(days, center)
+        return self._iter_with_archive(days, self._archive._days_between(start_date, end_date), center)
+    
+    def _days_between(self, start_date, end_date):
+        low = 0 if start_date is None else bisect.bisect_left(self._day_list, parse_date(start_date).toordinal())
+        high = len(self._day_list) if end_date is None else bisect.bisect_right(self._day_list, parse_date(end_date).toordinal())
+        return self._day_list[low:high]
+    
+    def _iter_days(self, days, center):
+        for day in days:
+            yield from self._iter_day(day, center)
+    
+    def _iter_with_archive(self, days, archived_days, center):
+        for day in sorted(set(days).union(archived_days)):
+            yield from self._archive._iter_day(day, center)
+            yield from self._iter_day(day, center)
+    
+    def export_report(self, filename, date=None, center=None, start_date=None, end_date=None,
+                      compress=None, split_by_center=False, include_archived=False):
+        if date is not None:
+            start_date = end_date = date
+        if compress is None:
+            compress = filename.endswith(".gz")
+        
+        if not split_by_center:
+            self._write_report(filename, self.iter_appointments(start_date, end_date, center, include_archived), compress)
+            return [filename]
+        
+        from concurrent.futures import ThreadPoolExecutor
+        
+        centers = list(self.centers) if center is None else [center]
+        filenames = [center_report_filename(filename, name) for name in centers]
+        with ThreadPoolExecutor(max_workers=len(centers)) as pool:
+            futures = [pool.submit(self._write_report, path,
+                                   self.iter_appointments(start_date, end_date, name, include_archived), compress)
+                       for path, name in zip(filenames, centers)]
+            errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise errors[0]
+        return filenames
+    
+    def export_analytics(self, filename, start_date=None, end_date=None, include_archived=True,
+                         processes=None, compress=None):
+        # A .json filename gets one document; anything else gets one CSV per
+        # pivot next to it, named like the per-center exports.
+        if compress is None:
+            compress = filename.endswith(".gz")
+        report = build_analytics(self, start_date, end_date, include_archived, processes)
+        
+        if filename.endswith((".json", ".json.gz")):
+            self._write_json(filename, report, compress)
+            return [filename]
+        
+        tables = {
+            "slots": (SLOT_HEADER, report["slots"]),
+            "utilization": (DAY_HEADER, report["utilization"]),
+            "domains": (DOMAIN_HEADER, report["domains"]),
+        }
+        filenames = []
+        for name, (header, rows) in tables.items():
+            path = center_report_filename(filename, name)
+            self._write_table(path, header, ([row[column] for column in header] for row in rows), compress)
+            filenames.append(path)
+        path = center_report_filename(filename, "timings")
+        timings = [[stage, seconds] for stage, seconds in report["timings"].items()]
+        timings += [[field, report[field]] for field in ("rows_read", "rows_skipped", "partitions", "processes")]
+        self._write_table(path, TIMING_HEADER, timings, compress)
+        filenames.append(path)
+        return filenames
+    
+    def _open_report(self, filename, compress):
+        if compress:
+            return gzip.open(filename, "wt", newline="", encoding="utf-8")
+        return open(filename, "w", newline="", encoding="utf-8", buffering=EXPORT_BUFFER_SIZE)
+    
+    def _write_report(self, filename, appointments, compress):
+        self._write_table(filename, HEADER, ((date, time, center, person.name, person.phone, person.email)
+                                             for date, time, center, person in appointments), compress)
+    
+    def _write_table(self, filename, header, rows, compress):
+        try:
+            with self._open_report(filename, compress) as file:
                 writer = csv.writer(file)
-                writer.writerow(["Date", "Time", "Center", "Name", "Phone", "Email"])
-                
-                for date, time, center, person in appointments:
-                    writer.writerow([date, time, center, person["name"], 
-                                   person["phone"], person["email"]])
-            return True
-        except:
-            return False
\ No newline at end of file
+                writer.writerow(header)
+                writer.writerows(rows)
+        except (OSError, csv.Error) as error:
+            if os.path.exists(filename):
+                os.remove(filename)
+            raise ExportError(f"Could not write report {filename}: {error}") from error
+    
+    def _write_json(self, filename, data, compress):
+        try:
+            with self._open_report(filename, compress) as file:
+                json.dump(data, file, indent=2)
+        except (OSError, TypeError, ValueError) as error:
+            if os.path.exists(filename):
+                os.remove(filename)
+            raise ExportError(f"Could not write report {filename}: {error}") from error
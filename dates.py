@@ -0,0 +1,26 @@
+import datetime
+import functools
+
+DATE_FORMATS = ("%m/%d/%y", "%m/%d/%Y", "%Y-%m-%d", "%d.%m.%y", "%d.%m.%Y")
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_string(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognized date: {value}")
+
+def parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return _parse_date_string(value.strip())
+
+def date_key(value):
+    # The same day written in different formats gets one key; unparseable
+    # dates only match themselves.
+    try:
+        return parse_date(value).toordinal()
+    except ValueError:
+        return value
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import sys
+import csv
+import argparse
+from data_manager import DataManager, parse_date
+from dates import date_key
+from storage import within_capacity
+from validator import InputValidator
+
+REPORT_HEADER = ["Line", "Email", "Status", "Reason"]
+
+def read_roster(file):
+    reader = csv.reader(file)
+    header = [column.strip().lower() for column in next(reader, [])]
+    try:
+        columns = [header.index(field) for field in ("date", "time", "center", "name", "phone", "email")]
+    except ValueError:
+        raise ValueError("Roster header must contain Date, Time, Center, Name, Phone and Email")
+
+    for line, row in enumerate(reader, start=2):
+        if not any(field.strip() for field in row):
+            continue
+        yield line, [row[i].strip() if i < len(row) else "" for i in columns]
+
+def check_row(manager, validator, row, seen_emails):
+    date, time, center, name, phone, email = row
+    if center not in manager.centers:
+        return f"Unknown center: {center}"
+    if time not in manager.time_slots:
+        return f"Unknown time slot: {time}"
+    try:
+        parse_date(date)
+    except ValueError as error:
+        return str(error)
+
+    is_valid, errors = validator.validate_appointment_form(name, phone, email)
+    if not is_valid:
+        return "; ".join(errors)
+
+    folded = email.casefold()
+    if folded in seen_emails:
+        return f"Duplicate email in roster (first on line {seen_emails[folded]})"
+    slot = (date_key(date), time, center)
+    for booked_date, booked_time, booked_center, _ in manager.get_appointments_by_email(email):
+        if (date_key(booked_date), booked_time, booked_center) == slot:
+            return "Already booked in this slot"
+    return None
+
+def import_roster(manager, rows, dry_run=False):
+    validator = InputValidator()
+    seen_emails = {}
+    report = []
+    candidates = []
+
+    for line, row in rows:
+        reason = check_row(manager, validator, row, seen_emails)
+        if reason is None:
+            seen_emails[row[5].casefold()] = line
+            candidates.append((line, row))
+            report.append([line, row[5], "accepted", ""])
+        else:
+            report.append([line, row[5], "rejected", reason])
+
+    # Capacity is checked against current occupancy plus earlier roster rows,
+    # and every accepted row is committed with a single write. A dry run
+    # makes the same check without writing.
+    rows = [row for _, row in candidates]
+    if dry_run:
+        accepted = within_capacity(rows, [manager.slot_capacity[row[2]] for row in rows],
+                                   [manager.booked_count(*row[:3]) for row in rows])
+    else:
+        accepted = manager.add_appointments_bulk(rows)
+    by_line = {entry[0]: entry for entry in report}
+    for (line, _), ok in zip(candidates, accepted):
+        if not ok:
+            by_line[line][2:] = ["rejected", "Slot is full"]
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Book every person on a CSV roster in one batch")
+    parser.add_argument("roster", help="CSV file with Date, Time, Center, Name, Phone and Email columns")
+    parser.add_argument("--data", default="appointments.csv", help="CSV file or SQLite database (.db)")
+    parser.add_argument("--report", help="write the per-row report here instead of standard output")
+    parser.add_argument("--dry-run", action="store_true", help="validate the roster without booking")
+    args = parser.parse_args()
+
+    manager = DataManager(args.data)
+    try:
+        with open(args.roster, "r", newline="", encoding="utf-8") as file:
+            report = import_roster(manager, read_roster(file), args.dry_run)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        # A dry run writes nothing, not even a compacted snapshot.
+        manager.close(compact=not args.dry_run)
+
+    output = open(args.report, "w", newline="", encoding="utf-8") if args.report else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(REPORT_HEADER)
+        writer.writerows(report)
+    finally:
+        if args.report:
+            output.close()
+
+    accepted = sum(1 for entry in report if entry[2] == "accepted")
+    print(f"{accepted} accepted, {len(report) - accepted} rejected", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,46 @@
 #!/usr/bin/env python3
 import sys
-import _tkinter
 import tkinter as tk
 from tkinter import ttk, messagebox
 from tkcalendar import Calendar
+import queue
 import datetime
-from data_manager import DataManager
+from dates import parse_date
+from data_manager import DataManager, ExportError
+from storage import BackgroundStorage, open_storage
+from metrics import metrics_from_environment
 from validator import InputValidator
+from tree_view import VirtualTreeView, appointment_rows
+
+CHANGE_POLL_MS = 500
+
+HANDLERS = ("update_center_details", "update_available_slots", "find_next_available", "schedule_appointment",
+            "search_appointments", "cancel_appointment", "refresh_admin_view", "admin_cancel_appointment",
+            "export_report", "poll_changes")
 
 class VaccinationScheduler:
-    def __init__(self, root):
+    def __init__(self, root, data_file="appointments.csv"):
         self.root = root
         self.root.title("COVID-19 Vaccination Scheduler")
         self.root.geometry("900x600")
         self.root.configure(bg="#f0f0f0")
         
-        self.data_manager = DataManager()
+        # Instrumentation is off unless SCHEDULER_METRICS and friends are set;
+        # handlers are wrapped before any widget binds them.
+        self.metrics = metrics_from_environment()
+        if self.metrics is not None:
+            self.metrics.instrument(self, HANDLERS, kind="handler")
+        
+        # Writes to local files happen on a worker thread; a shared database
+        # is written directly because booking checks capacity in the database.
+        self.write_errors = queue.SimpleQueue()
+        storage = open_storage(data_file)
+        if not storage.shared:
+            storage = BackgroundStorage(storage, self.write_errors.put)
+        
+        # The admin calendar reaches back 30 days; older history is loaded
+        # only when a search needs it.
+        self.data_manager = DataManager(data_file, history_days=30, storage=storage, metrics=self.metrics)
         self.validator = InputValidator()
         self.tab_control = ttk.Notebook(root)
         
@@ -29,14 +54,73 @@ class VaccinationScheduler:
         
         self.tab_control.pack(expand=1, fill="both")
         
+        # Only the first tab is built up front; the others are built the
+        # first time they are selected.
+        self.unbuilt_tabs = {str(self.view_tab): self.setup_view_tab, str(self.admin_tab): self.setup_admin_tab}
         self.setup_schedule_tab()
-        self.setup_view_tab()
-        self.setup_admin_tab()
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         root.protocol("WM_DELETE_WINDOW", self.on_close)
-        
+        self.root.after(250, self.check_write_errors)
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        
+    def check_write_errors(self):
+        error = None
+        while True:
+            try:
+                error = self.write_errors.get_nowait()
+            except queue.Empty:
+                break
+        if error is not None:
+            # The failed changes stay queued and are retried with the next
+            # change or on exit.
+            messagebox.showerror("Error", f"Appointments could not be saved: {error}\n\n"
+                                          "They will be saved again with your next change.")
+        self.root.after(250, self.check_write_errors)
+    
+    def poll_changes(self):
+        # Picks up bookings and cancellations made by other instances and
+        # redraws only the views showing an affected date or email.
+        try:
+            changes = self.data_manager.refresh()
+            if changes is None:
+                days, emails = None, None
+            elif changes:
+                days, emails = set(), {row[-1].strip().casefold() for _, row in changes}
+                for _, row in changes:
+                    try:
+                        days.add(parse_date(row[0]))
+                    except ValueError:
+                        pass
+            else:
+                return
+            
+            if days is None or parse_date(self.cal.get_date()) in days:
+                self.update_available_slots()
+            if str(self.admin_tab) not in self.unbuilt_tabs and (
+                    days is None or parse_date(self.admin_cal.get_date()) in days):
+                self.request_admin_refresh()
+            if str(self.view_tab) not in self.unbuilt_tabs and self.searched_email and (
+                    emails is None or self.searched_email.casefold() in emails):
+                self.appointments_view.update(appointment_rows(
+                    self.data_manager.get_appointments_by_email(self.searched_email)))
+        finally:
+            self.root.after(CHANGE_POLL_MS, self.poll_changes)
+    
+    def on_tab_changed(self, event):
+        setup = self.unbuilt_tabs.pop(str(self.tab_control.select()), None)
+        if setup is not None:
+            setup()
+    
     def on_close(self):
-        self.data_manager.save_appointments()
+        try:
+            self.data_manager.close()
+        except Exception as error:
+            if not messagebox.askyesno("Error", f"Appointments could not be saved: {error}\n\n"
+                                                "Close anyway and lose unsaved changes?"):
+                return
+        if self.metrics is not None:
+            self.metrics.close()
         self.root.destroy()
         
     def setup_schedule_tab(self):
@@ -87,6 +171,9 @@ class VaccinationScheduler:
         
         self.time_var.set(self.data_manager.time_slots[0])  
         
+        ttk.Button(right_frame, text="Find Earliest Available Slot",
+                   command=self.find_next_available).pack(anchor="w")
+        
         info_frame = ttk.LabelFrame(right_frame, text="Personal Information", padding=10)
         info_frame.pack(fill="x", pady=(10, 0))
         
@@ -120,12 +207,23 @@ class VaccinationScheduler:
         selected_date = self.cal.get_date()
         selected_center = self.center_var.get()
         
-        for i, button in enumerate(self.time_buttons):
-            button.config(state="normal")
-            
+        grid = self.data_manager.availability(selected_date, center=selected_center)
+        remaining = next(iter(grid.values()))[selected_center]
+        
         for i, time in enumerate(self.data_manager.time_slots):
-            if not self.data_manager.is_slot_available(selected_date, time, selected_center):
-                self.time_buttons[i].config(state="disabled")
+            self.time_buttons[i].config(state="normal" if remaining[time] > 0 else "disabled")
+    
+    def find_next_available(self):
+        slot = self.data_manager.next_available_slot()
+        if slot is None:
+            messagebox.showinfo("Info", "There are no free slots in the next 30 days.")
+            return
+        
+        date, time, center = slot
+        self.cal.selection_set(parse_date(date))
+        self.center_var.set(center)
+        self.update_available_slots()
+        self.time_var.set(time)
     
     def schedule_appointment(self):
         name = self.name_var.get().strip()
@@ -141,12 +239,11 @@ class VaccinationScheduler:
         selected_time = self.time_var.get()
         selected_center = self.center_var.get()
         
-        if not self.data_manager.is_slot_available(selected_date, selected_time, selected_center):
+        if not self.data_manager.book_appointment(selected_date, selected_time, selected_center, name, phone, email):
             messagebox.showerror("Error", "This time slot is no longer available. Please select another.")
             self.update_available_slots()
             return
         
-        self.data_manager.add_appointment(selected_date, selected_time, selected_center, name, phone, email)
         confirmation = f"Appointment scheduled!\n\nDate: {selected_date}\nTime: {selected_time}\nCenter: {selected_center}"
         messagebox.showinfo("Success", confirmation)
         
@@ -155,6 +252,7 @@ class VaccinationScheduler:
         self.email_var.set("")
         
         self.update_available_slots()
+        self.request_admin_refresh()
     
     def setup_view_tab(self):
         frame = ttk.Frame(self.view_tab, padding=20)
@@ -180,7 +278,8 @@ class VaccinationScheduler:
             self.appointments_tree.column(col, width=100)
         
         scrollbar = ttk.Scrollbar(self.results_frame, orient="vertical", command=self.appointments_tree.yview)
-        self.appointments_tree.configure(yscrollcommand=scrollbar.set)
+        self.appointments_view = VirtualTreeView(self.appointments_tree, scrollbar)
+        self.searched_email = ""
         
         self.appointments_tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
@@ -193,23 +292,17 @@ class VaccinationScheduler:
     def search_appointments(self):
         search_email = self.search_email.get().strip().lower()
         
-        for item in self.appointments_tree.get_children():
-            self.appointments_tree.delete(item)
-        
         if not search_email:
+            self.appointments_view.reset([])
             messagebox.showinfo("Info", "Please enter an email to search.")
             return
         
         appointments = self.data_manager.get_appointments_by_email(search_email)
+        self.searched_email = search_email
+        self.appointments_view.reset(appointment_rows(appointments))
         
         if not appointments:
             messagebox.showinfo("Info", "No appointments found for this email.")
-            return
-            
-        for appt in appointments:
-            date, time, center, data = appt
-            self.appointments_tree.insert("", "end", values=(date, time, center, 
-                                                       data["name"], data["phone"], data["email"]))
     
     def cancel_appointment(self):
         selected_item = self.appointments_tree.selection()
@@ -228,7 +321,9 @@ class VaccinationScheduler:
         success = self.data_manager.cancel_appointment(date, time, center, email)
         
         if success:
-            self.appointments_tree.delete(selected_item)
+            self.appointments_view.update(appointment_rows(
+                self.data_manager.get_appointments_by_email(self.searched_email)))
+            self.request_admin_refresh()
             messagebox.showinfo("Success", "Appointment has been cancelled.")
         else:
             messagebox.showerror("Error", "Failed to cancel appointment.")
@@ -267,6 +362,9 @@ class VaccinationScheduler:
         self.center_distribution_var = tk.StringVar(value="")
         ttk.Label(stats_frame, textvariable=self.center_distribution_var).grid(row=0, column=1, padx=10)
         
+        self.week_utilization_var = tk.StringVar(value="")
+        ttk.Label(stats_frame, textvariable=self.week_utilization_var).grid(row=1, column=0, columnspan=2, padx=10, sticky="w")
+        
         appointments_frame = ttk.LabelFrame(content_frame, text="Appointments", padding=10)
         appointments_frame.pack(fill="both", expand=True)
         
@@ -278,7 +376,9 @@ class VaccinationScheduler:
             self.admin_tree.column(col, width=100)
         
         scrollbar = ttk.Scrollbar(appointments_frame, orient="vertical", command=self.admin_tree.yview)
-        self.admin_tree.configure(yscrollcommand=scrollbar.set)
+        self.admin_view = VirtualTreeView(self.admin_tree, scrollbar)
+        self.admin_query = None
+        self.admin_refresh_pending = False
         
         self.admin_tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
@@ -292,35 +392,45 @@ class VaccinationScheduler:
 
         self.refresh_admin_view()
         
-        self.admin_cal.bind("<<CalendarSelected>>", lambda event: self.refresh_admin_view())
-        self.admin_center_var.trace_add("write", lambda *args: self.refresh_admin_view())
+        self.admin_cal.bind("<<CalendarSelected>>", lambda event: self.request_admin_refresh())
+        self.admin_center_var.trace_add("write", lambda *args: self.request_admin_refresh())
+    
+    def request_admin_refresh(self, *args):
+        if str(self.admin_tab) in self.unbuilt_tabs:
+            return
+        # Several events can fire for one user action; they share one refresh.
+        if not self.admin_refresh_pending:
+            self.admin_refresh_pending = True
+            self.root.after_idle(self.refresh_admin_view)
     
     def refresh_admin_view(self, *args):
+        self.admin_refresh_pending = False
         selected_date = self.admin_cal.get_date()
         selected_center = self.admin_center_var.get()
         
-        for item in self.admin_tree.get_children():
-            self.admin_tree.delete(item)
-        
         center = None if selected_center == "All Centers" else selected_center
         appointments = self.data_manager.get_filtered_appointments(selected_date, center)
         
-        for appt in appointments:
-            date, time, center, data = appt
-            self.admin_tree.insert("", "end", values=(date, time, center, 
-                                                 data["name"], data["phone"], data["email"]))
+        rows = appointment_rows(appointments)
+        if self.admin_query == (selected_date, selected_center):
+            self.admin_view.update(rows)
+        else:
+            self.admin_view.reset(rows)
+        self.admin_query = (selected_date, selected_center)
         
-        self.total_appointments_var.set(f"Total Appointments: {len(appointments)}")
+        day = self.data_manager.day_utilization(selected_date, center)
+        week = self.data_manager.week_utilization(selected_date, center)
+        self.total_appointments_var.set(f"Total Appointments: {day['booked']} ({day['utilization']:.0%} full)")
         
         if selected_center == "All Centers":
-            center_counts = {}
-            for _, _, center, _ in appointments:
-                center_counts[center] = center_counts.get(center, 0) + 1
-            
-            distribution = ", ".join(f"{center}: {count}" for center, count in center_counts.items())
+            distribution = ", ".join(f"{name}: {stats['booked']} ({stats['utilization']:.0%})"
+                                     for name, stats in day["centers"].items() if stats["booked"])
             self.center_distribution_var.set(f"Distribution: {distribution}")
         else:
             self.center_distribution_var.set("")
+        
+        self.week_utilization_var.set(f"Week of {week['start']:%d %b}: {week['booked']} booked, "
+                                      f"{week['utilization']:.0%} of capacity")
     
     def admin_cancel_appointment(self):
         selected_item = self.admin_tree.selection()
@@ -339,10 +449,8 @@ class VaccinationScheduler:
         success = self.data_manager.cancel_appointment(date, time, center, email)
         
         if success:
-            self.admin_tree.delete(selected_item)
-            messagebox.showinfo("Success", "Appointment has been cancelled.")
-            
             self.refresh_admin_view()
+            messagebox.showinfo("Success", "Appointment has been cancelled.")
         else:
             messagebox.showerror("Error", "Failed to cancel appointment.")
     
@@ -353,7 +461,7 @@ class VaccinationScheduler:
         
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes=[("CSV files", "*.csv"), ("Compressed CSV files", "*.csv.gz"), ("All files", "*.*")],
             initialfile=f"vaccination_report_{selected_date}.csv"
         )
         
@@ -361,11 +469,17 @@ class VaccinationScheduler:
             return
         
         center = None if selected_center == "All Centers" else selected_center
-        success = self.data_manager.export_report(filename, selected_date, center)
+        try:
+            self.data_manager.export_report(filename, selected_date, center)
+        except ExportError as error:
+            messagebox.showerror("Export Failed", str(error))
+            return
+        messagebox.showinfo("Success", f"Report exported to {filename}")
 
 def main():
     root = tk.Tk()
-    app = VaccinationScheduler(root)
+    data_file = sys.argv[1] if len(sys.argv) > 1 else "appointments.csv"
+    app = VaccinationScheduler(root, data_file)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import collections
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DATA_MANAGER_OPERATIONS = (
+    "load_appointments", "save_appointments", "add_appointment", "book_appointment",
+    "add_appointments_bulk", "cancel_appointment", "get_appointments_by_email",
+    "get_filtered_appointments", "get_appointments_in_range", "iter_appointments",
+    "booked_count", "is_slot_available", "availability", "utilization", "next_available_slot",
+    "allocate_waitlist", "export_report", "export_analytics",
+)
+
+QUERY_OPERATIONS = ("get_appointments_by_email", "get_filtered_appointments",
+                    "get_appointments_in_range", "iter_appointments")
+
+class Histogram:
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and value > LATENCY_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+
+class SamplingProfiler:
+
+    # Samples one thread's stack every interval seconds and counts identical
+    # stacks, in the folded format flame graph tools read.
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def _run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+class Metrics:
+
+    # Nothing is measured unless an object is passed to instrument(); the
+    # originals stay in place otherwise, so disabled metrics cost nothing.
+    def __init__(self, profile=(), profile_mode="cprofile", profile_dir=".", dump_file=None):
+        self.lock = threading.Lock()
+        self.errors = collections.Counter()
+        self.rows = collections.Counter()
+        self.histograms = {}
+        self.sources = []
+        self.profile = set(profile)
+        self.profile_mode = profile_mode
+        self.profile_dir = profile_dir
+        self.profile_runs = 0
+        self.dump_file = dump_file
+
+    def observe(self, kind, name, seconds, rows=None, failed=False):
+        key = (kind, name)
+        with self.lock:
+            if failed:
+                self.errors[key] += 1
+            if rows is not None:
+                self.rows[key] += rows
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def count_rows(self, kind, name, rows):
+        with self.lock:
+            self.rows[(kind, name)] += rows
+
+    def add_source(self, name, read):
+        # Values such as bytes written are owned elsewhere and read on dump.
+        self.sources.append((name, read))
+
+    def wrap(self, kind, name, function, rows_from_result=False):
+        profiled = name in self.profile
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            rows = None
+            try:
+                if profiled:
+                    result = self._profile(name, function, args, kwargs)
+                else:
+                    result = function(*args, **kwargs)
+                failed = False
+            finally:
+                elapsed = time.perf_counter() - started
+                if not failed and rows_from_result:
+                    if isinstance(result, list):
+                        rows = len(result)
+                    elif hasattr(result, "__next__"):
+                        # Generators are counted as the caller consumes them.
+                        result = self._count_iterator(kind, name, result)
+                self.observe(kind, name, elapsed, rows, failed)
+            return result
+
+        return wrapper
+
+    def _count_iterator(self, kind, name, iterator):
+        rows = 0
+        try:
+            for row in iterator:
+                rows += 1
+                yield row
+        finally:
+            self.count_rows(kind, name, rows)
+
+    def _profile(self, name, function, args, kwargs):
+        with self.lock:
+            self.profile_runs += 1
+            path = os.path.join(self.profile_dir, f"{name}-{os.getpid()}-{self.profile_runs}")
+        if self.profile_mode == "sample":
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.stop()
+                profiler.write(path + ".folded")
+
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args, **kwargs)
+        finally:
+            profiler.dump_stats(path + ".prof")
+
+    def instrument(self, target, names, kind="operation", queries=()):
+        for name in names:
+            setattr(target, name, self.wrap(kind, name, getattr(target, name), name in queries))
+
+    def instrument_data_manager(self, manager):
+        self.instrument(manager, DATA_MANAGER_OPERATIONS, queries=QUERY_OPERATIONS)
+        self.add_source("storage_bytes_written_total", lambda: getattr(manager.storage, "bytes_written", 0))
+        self.add_source("appointments", lambda: manager.count)
+        self.add_source("query_cache_hits_total", lambda: manager.cache_hits)
+        self.add_source("query_cache_misses_total", lambda: manager.cache_misses)
+
+    def snapshot(self):
+        with self.lock:
+            keys = sorted(self.histograms)
+            entries = {}
+            for kind, name in keys:
+                histogram = self.histograms[(kind, name)]
+                entries.setdefault(kind, {})[name] = {
+                    "calls": histogram.count,
+                    "errors": self.errors[(kind, name)],
+                    "rows_returned": self.rows[(kind, name)],
+                    "seconds_total": histogram.total,
+                    "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"],
+                                        histogram.counts)),
+                }
+        return {"operations": entries.get("operation", {}),
+                "handlers": entries.get("handler", {}),
+                "gauges": {name: read() for name, read in self.sources}}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def close(self):
+        if self.dump_file:
+            with open(self.dump_file, "w", encoding="utf-8") as file:
+                file.write(self.to_json())
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for kind in ("operation", "handler"):
+                keys = [key for key in sorted(self.histograms) if key[0] == kind]
+                if not keys:
+                    continue
+                metric = f"scheduler_{kind}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for key in keys:
+                    histogram = self.histograms[key]
+                    label = f'{kind}="{key[1]}"'
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+                    lines.append(f"{metric}_sum{{{label}}} {histogram.total}")
+                    lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+                lines.append(f"# TYPE scheduler_{kind}_errors_total counter")
+                for key in keys:
+                    lines.append(f'scheduler_{kind}_errors_total{{{kind}="{key[1]}"}} {self.errors[key]}')
+            returned = sorted(key for key in self.rows if key[0] == "operation")
+            if returned:
+                lines.append("# TYPE scheduler_rows_returned_total counter")
+                for key in returned:
+                    lines.append(f'scheduler_rows_returned_total{{operation="{key[1]}"}} {self.rows[key]}')
+        for name, read in self.sources:
+            lines.append(f"# TYPE scheduler_{name} {'counter' if name.endswith('_total') else 'gauge'}")
+            lines.append(f"scheduler_{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = metrics.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                content = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+        return server
+
+def metrics_from_environment(environ=os.environ):
+    # SCHEDULER_METRICS=1 turns instrumentation on; SCHEDULER_METRICS_PORT
+    # also serves it locally, SCHEDULER_METRICS_FILE receives a JSON dump on
+    # exit, and SCHEDULER_PROFILE names operations to profile with cProfile
+    # (or by sampling, with SCHEDULER_PROFILE_MODE=sample).
+    port = environ.get("SCHEDULER_METRICS_PORT")
+    profile = [name for name in environ.get("SCHEDULER_PROFILE", "").split(",") if name]
+    if not (environ.get("SCHEDULER_METRICS") or environ.get("SCHEDULER_METRICS_FILE") or port or profile):
+        return None
+
+    metrics = Metrics(profile, environ.get("SCHEDULER_PROFILE_MODE", "cprofile"),
+                      environ.get("SCHEDULER_PROFILE_DIR", "."), environ.get("SCHEDULER_METRICS_FILE"))
+    if port:
+        metrics.serve(int(port))
+    return metrics
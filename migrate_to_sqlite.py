@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+from data_manager import DataManager
+from storage import CsvStorage, SqliteStorage
+
+def migrate(csv_file, db_file, append=False):
+    # Loading through DataManager replays any pending journal on top of the
+    # CSV snapshot, so the database receives the current state.
+    source = DataManager(csv_file, storage=CsvStorage(csv_file))
+    target = SqliteStorage(db_file)
+    try:
+        if target.count() and not append:
+            raise ValueError(f"{db_file} already contains appointments; use --append to add to them")
+        target.add_many(source.iter_rows())
+    finally:
+        target.close()
+    return source.count
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy appointments from a CSV file into a SQLite database")
+    parser.add_argument("csv_file", nargs="?", default="appointments.csv")
+    parser.add_argument("db_file", nargs="?", default="appointments.db")
+    parser.add_argument("--append", action="store_true", help="add to a database that already has appointments")
+    args = parser.parse_args()
+    
+    try:
+        count = migrate(args.csv_file, args.db_file, args.append)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(f"Migrated {count} appointments from {args.csv_file} to {args.db_file}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
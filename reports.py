@@ -0,0 +1,158 @@
+import time
+import datetime
+import collections
+from dates import parse_date
+from storage import OP_ADD, open_storage
+
+PARTITION_ROWS = 50000
+
+SLOT_HEADER = ["Date", "Center", "Time", "Booked", "Capacity", "Utilization"]
+DAY_HEADER = ["Date", "Center", "Booked", "Capacity", "Utilization", "No-show candidates"]
+DOMAIN_HEADER = ["Domain", "Appointments"]
+TIMING_HEADER = ["Stage", "Seconds"]
+
+def aggregate_partition(rows, start=None, end=None):
+    # Counts one partition of (op, date, slot, center, email) records. A
+    # cancel counts -1, so journal replays net out without matching rows.
+    slots = collections.Counter()
+    domains = collections.Counter()
+    skipped = 0
+    for op, date, slot, center, email in rows:
+        try:
+            day = parse_date(date).toordinal()
+        except ValueError:
+            skipped += 1
+            continue
+        if (start is not None and day < start) or (end is not None and day > end):
+            continue
+        delta = 1 if op == OP_ADD else -1
+        slots[(day, center, slot)] += delta
+        domains[email.rpartition("@")[2].strip().casefold()] += delta
+    return slots, domains, skipped
+
+def _stored_rows(manager, include_archived):
+    # A separate storage object reads the files, so the manager's own change
+    # feed position and caches are left alone.
+    flush = getattr(manager.storage, "flush", None)
+    if flush is not None:
+        flush()
+    storage = open_storage(manager.data_file)
+    try:
+        sources = [storage.load()]
+        if include_archived:
+            sources.append(storage.load_archive())
+        for source in sources:
+            for op, row in source:
+                if op == OP_ADD:
+                    yield op, row[0], row[1], row[2], row[5]
+                else:
+                    yield op, row[0], row[1], row[2], row[3]
+    finally:
+        storage.close()
+
+def _partitions(rows, count, size):
+    # Rows are routed by date, so every date's rows stay in one partition
+    # stream; a partition is handed off whenever it reaches size rows.
+    buffers = [[] for _ in range(count)]
+    for row in rows:
+        buffer = buffers[hash(row[1]) % count]
+        buffer.append(row)
+        if len(buffer) >= size:
+            yield buffer
+            buffers[hash(row[1]) % count] = []
+    for buffer in buffers:
+        if buffer:
+            yield buffer
+
+def build_analytics(manager, start_date=None, end_date=None, include_archived=True, processes=None,
+                    partition_rows=PARTITION_ROWS):
+    started = time.perf_counter()
+    start = None if start_date is None else parse_date(start_date).toordinal()
+    end = None if end_date is None else parse_date(end_date).toordinal()
+
+    slots = collections.Counter()
+    domains = collections.Counter()
+    skipped = 0
+    rows = 0
+    partitions = 0
+
+    def counted(source):
+        nonlocal rows
+        for row in source:
+            rows += 1
+            yield row
+
+    chunks = _partitions(counted(_stored_rows(manager, include_archived)), max(1, (processes or 1) * 4),
+                         partition_rows)
+    if not processes or processes < 2:
+        for chunk in chunks:
+            partitions += 1
+            partial_slots, partial_domains, partial_skipped = aggregate_partition(chunk, start, end)
+            slots.update(partial_slots)
+            domains.update(partial_domains)
+            skipped += partial_skipped
+    else:
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        with ProcessPoolExecutor(processes) as pool:
+            pending = set()
+            for chunk in chunks:
+                partitions += 1
+                pending.add(pool.submit(aggregate_partition, chunk, start, end))
+                # Reading stays at most two partitions per worker ahead.
+                if len(pending) >= processes * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        partial_slots, partial_domains, partial_skipped = future.result()
+                        slots.update(partial_slots)
+                        domains.update(partial_domains)
+                        skipped += partial_skipped
+            for future in pending:
+                partial_slots, partial_domains, partial_skipped = future.result()
+                slots.update(partial_slots)
+                domains.update(partial_domains)
+                skipped += partial_skipped
+    aggregated = time.perf_counter()
+
+    today = datetime.date.today().toordinal()
+    time_order = {name: index for index, name in enumerate(manager.time_slots)}
+    center_order = {name: index for index, name in enumerate(manager.centers)}
+    slot_rows = []
+    day_totals = collections.Counter()
+    for (day, center, slot), booked in sorted(
+            slots.items(), key=lambda item: (item[0][0], time_order.get(item[0][2], len(time_order)),
+                                             center_order.get(item[0][1], len(center_order)), item[0])):
+        if booked <= 0:
+            continue
+        capacity = manager.slot_capacity.get(center)
+        slot_rows.append([datetime.date.fromordinal(day).isoformat(), center, slot, booked, capacity or "",
+                          round(booked / capacity, 4) if capacity else ""])
+        day_totals[(day, center)] += booked
+
+    day_rows = []
+    for (day, center), booked in sorted(day_totals.items(),
+                                        key=lambda item: (item[0][0], center_order.get(item[0][1], len(center_order)))):
+        capacity = manager.centers.get(center, {}).get("capacity")
+        # Attendance is not recorded, so every appointment whose date has
+        # passed is a candidate for no-show follow-up.
+        day_rows.append([datetime.date.fromordinal(day).isoformat(), center, booked, capacity or "",
+                         round(booked / capacity, 4) if capacity else "", booked if day < today else 0])
+
+    domain_rows = [[domain, count] for domain, count in sorted(domains.items(), key=lambda item: (-item[1], item[0]))
+                   if count > 0]
+    finished = time.perf_counter()
+
+    return {
+        "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "rows_read": rows,
+        "rows_skipped": skipped,
+        "partitions": partitions,
+        "processes": processes or 1,
+        "timings": {
+            "read_and_aggregate": round(aggregated - started, 6),
+            "pivot": round(finished - aggregated, 6),
+        },
+        "slots": [dict(zip(SLOT_HEADER, row)) for row in slot_rows],
+        "utilization": [dict(zip(DAY_HEADER, row)) for row in day_rows],
+        "domains": [dict(zip(DOMAIN_HEADER, row)) for row in domain_rows],
+    }
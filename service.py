@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+import io
+import csv
+import sys
+import json
+import signal
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from data_manager import DataManager, HEADER, parse_date
+from storage import BatchedStorage, open_storage
+from validator import InputValidator
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error"}
+
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def appointment_json(row):
+    date, time, center, person = row
+    return {"date": date, "time": time, "center": center,
+            "name": person["name"], "phone": person["phone"], "email": person["email"]}
+
+class BookingService:
+
+    def __init__(self, data_file="appointments.csv", flush_interval=0.0):
+        # A shared database checks capacity inside its own booking
+        # transaction, so only single-writer storage is batched in memory.
+        storage = open_storage(data_file)
+        self.storage = storage if storage.shared else BatchedStorage(storage)
+        self.data_manager = DataManager(data_file, storage=self.storage)
+        self.validator = InputValidator()
+        self.flush_interval = flush_interval
+        self.slot_locks = {}
+        self.commit_waiter = None
+        self.flushing = False
+
+    def slot_lock(self, date, time, center):
+        key = (date, time, center)
+        lock = self.slot_locks.get(key)
+        if lock is None:
+            lock = self.slot_locks[key] = asyncio.Lock()
+        return lock
+
+    async def commit(self):
+        # Group commit: every change buffered while a write is in flight is
+        # written together by the next one.
+        if self.storage.shared:
+            # Every change was committed by the storage as it was made.
+            return
+        loop = asyncio.get_running_loop()
+        if self.commit_waiter is None:
+            self.commit_waiter = loop.create_future()
+        waiter = self.commit_waiter
+        if not self.flushing:
+            self.flushing = True
+            loop.create_task(self.flush_loop())
+        await waiter
+
+    async def flush_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.storage.pending:
+                if self.flush_interval:
+                    await asyncio.sleep(self.flush_interval)
+                waiter, self.commit_waiter = self.commit_waiter, None
+                changes = self.storage.take_pending()
+                try:
+                    await loop.run_in_executor(None, self.storage.storage.write_batch, changes)
+                except Exception as error:
+                    # The changes stay queued for the next commit; everyone
+                    # waiting on this one is told the write failed.
+                    self.storage.requeue(changes)
+                    for failed in (waiter, self.commit_waiter):
+                        if failed is not None and not failed.done():
+                            failed.set_exception(error)
+                    self.commit_waiter = None
+                    break
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+
+                if self.storage.storage.needs_compaction:
+                    # Rows are captured on the loop thread, and the changes
+                    # still pending are already in them, so they are taken out
+                    # of the queue instead of being journaled again. Their
+                    # waiters are answered once the snapshot is written.
+                    rows = list(self.data_manager.iter_rows())
+                    waiter, self.commit_waiter = self.commit_waiter, None
+                    changes = self.storage.take_pending()
+                    try:
+                        if await loop.run_in_executor(None, self.storage.storage.save, rows) is False:
+                            # Another instance replaced the files first, so
+                            # the changes go to the journal after all.
+                            await loop.run_in_executor(None, self.storage.storage.write_batch, changes)
+                    except Exception as error:
+                        self.storage.requeue(changes)
+                        for failed in (waiter, self.commit_waiter):
+                            if failed is not None and not failed.done():
+                                failed.set_exception(error)
+                        self.commit_waiter = None
+                        break
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(None)
+        finally:
+            self.flushing = False
+
+    async def schedule(self, body):
+        fields = [str(body.get(field, "")).strip() for field in ("date", "time", "center", "name", "phone", "email")]
+        date, time, center, name, phone, email = fields
+        if center not in self.data_manager.centers:
+            raise HttpError(400, f"Unknown center: {center}")
+        if time not in self.data_manager.time_slots:
+            raise HttpError(400, f"Unknown time slot: {time}")
+        is_valid, errors = self.validator.validate_appointment_form(name, phone, email)
+        if not is_valid:
+            raise HttpError(400, "; ".join(errors))
+        parse_date(date)
+
+        async with self.slot_lock(date, time, center):
+            if not self.data_manager.book_appointment(date, time, center, name, phone, email):
+                raise HttpError(409, "This time slot is no longer available")
+            await self.commit()
+        return 201, {"date": date, "time": time, "center": center, "name": name, "phone": phone, "email": email}
+
+    async def cancel(self, body):
+        date, time, center, email = [str(body.get(field, "")).strip() for field in ("date", "time", "center", "email")]
+        async with self.slot_lock(date, time, center):
+            if not self.data_manager.cancel_appointment(date, time, center, email):
+                raise HttpError(404, "Appointment not found")
+            await self.commit()
+        return 200, {"cancelled": True}
+
+    def refresh(self):
+        # Other kiosks and services write to a shared database too; their
+        # changes are read from its change log before answering a read.
+        if self.storage.shared:
+            self.data_manager.refresh()
+
+    def search(self, query):
+        self.refresh()
+        if "email" in query:
+            rows = self.data_manager.get_appointments_by_email(query["email"])
+        elif "start" in query or "end" in query:
+            rows = self.data_manager.get_appointments_in_range(query.get("start"), query.get("end"), query.get("center"))
+        else:
+            rows = self.data_manager.get_filtered_appointments(query.get("date"), query.get("center"))
+        return 200, [appointment_json(row) for row in rows]
+
+    def availability(self, query):
+        if "start" not in query:
+            raise HttpError(400, "start is required")
+        center = query.get("center")
+        if center is not None and center not in self.data_manager.centers:
+            raise HttpError(400, f"Unknown center: {center}")
+        self.refresh()
+        grid = self.data_manager.availability(query["start"], query.get("end"), query.get("center"))
+        return 200, {day.isoformat(): centers for day, centers in grid.items()}
+
+    def export(self, query):
+        self.refresh()
+        if "date" in query:
+            rows = self.data_manager.iter_appointments(query["date"], query["date"], query.get("center"))
+        else:
+            rows = self.data_manager.iter_appointments(query.get("start"), query.get("end"), query.get("center"))
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(HEADER)
+        for date, time, center, person in rows:
+            writer.writerow([date, time, center, person["name"], person["phone"], person["email"]])
+        return 200, output.getvalue()
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/appointments" and method == "GET":
+                return self.search(query)
+            if url.path == "/appointments" and method == "POST":
+                return await self.schedule(self.parse_json(body))
+            if url.path == "/appointments/cancel" and method == "POST":
+                return await self.cancel(self.parse_json(body))
+            if url.path == "/availability" and method == "GET":
+                return self.availability(query)
+            if url.path == "/export" and method == "GET":
+                return self.export(query)
+            if url.path in ("/appointments", "/appointments/cancel", "/availability", "/export"):
+                raise HttpError(405, f"{method} is not supported on {url.path}")
+            raise HttpError(404, f"No route for {url.path}")
+        except HttpError as error:
+            return error.status, {"error": error.message}
+        except ValueError as error:
+            return 400, {"error": str(error)}
+
+    def parse_json(self, body):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "Request body must be JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Request body must be a JSON object")
+        return data
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    # Without a length the body cannot be skipped, so the
+                    # connection is closed after the response.
+                    status, payload = 400, {"error": "Invalid Content-Length header"}
+                    headers["connection"] = "close"
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self.dispatch(method.upper(), target, body)
+                    except Exception as error:
+                        status, payload = 500, {"error": str(error)}
+
+                if isinstance(payload, str):
+                    content, content_type = payload.encode("utf-8"), "text/csv; charset=utf-8"
+                else:
+                    content, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.data_manager.close()
+
+async def serve(service, host="127.0.0.1", port=8080):
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    address = server.sockets[0].getsockname()
+    print(f"Booking service listening on http://{address[0]}:{address[1]}", flush=True)
+    async with server:
+        await stop.wait()
+    while service.flushing:
+        await asyncio.sleep(0.01)
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless HTTP/JSON booking service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data", default="appointments.csv", help="CSV file or SQLite database (.db)")
+    parser.add_argument("--flush-interval", type=float, default=0.0,
+                        help="seconds to wait for more changes before each write")
+    args = parser.parse_args()
+
+    service = BookingService(args.data, args.flush_interval)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    finally:
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,893 @@
+import os
+import csv
+import uuid
+import gzip
+import marshal
+import hashlib
+import datetime
+import threading
+import contextlib
+import collections
+from dates import date_key, parse_date
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+HEADER = ["Date", "Time", "Center", "Name", "Phone", "Email"]
+
+OP_ADD = "A"
+OP_CANCEL = "C"
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+CACHE_VERSION = 1
+
+def open_storage(data_file, journal=True, journal_limit=1024 * 1024, cache=True):
+    if data_file.lower().endswith(SQLITE_EXTENSIONS):
+        return SqliteStorage(data_file)
+    if os.path.isdir(data_file) or data_file.endswith(("/", os.sep)):
+        return PartitionedStorage(data_file)
+    return CsvStorage(data_file, journal, journal_limit, cache)
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fsync_directory(path):
+    # Makes a completed rename durable. Directories cannot be opened for
+    # syncing on Windows, where the rename itself is as good as it gets.
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def file_lock(path, exclusive=False):
+    # An advisory lock on a separate file, shared by readers and appenders and
+    # held exclusively while files are replaced. Without fcntl (Windows) each
+    # instance runs unlocked.
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as file:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+def within_capacity(rows, capacities, booked):
+    added = {}
+    accepted = []
+    for row, capacity, count in zip(rows, capacities, booked):
+        slot = (date_key(row[0]), row[1], row[2])
+        ok = count + added.get(slot, 0) < capacity
+        if ok:
+            added[slot] = added.get(slot, 0) + 1
+        accepted.append(ok)
+    return accepted
+
+class Storage:
+
+    # Defaults shared by the backends: no archive, no change log, nothing to
+    # release, and every add or cancel goes through write_batch().
+    shared = False
+    needs_compaction = False
+
+    def load_archive(self):
+        return iter(())
+
+    def read_changes(self):
+        return []
+
+    def add(self, row):
+        self.write_batch([(OP_ADD, row)])
+
+    def add_many(self, rows):
+        self.write_batch([(OP_ADD, row) for row in rows])
+
+    def cancel(self, row):
+        self.write_batch([(OP_CANCEL, row)])
+        return True
+
+    def close(self):
+        pass
+
+class SingleWriterStorage(Storage):
+
+    # Capacity is checked against the caller's in-memory counters, which is
+    # authoritative only while this process is the only writer.
+    def book(self, row, capacity, booked):
+        if booked >= capacity:
+            return False
+        self.add(row)
+        return True
+
+    def book_many(self, rows, capacities, booked):
+        accepted = within_capacity(rows, capacities, booked)
+        self.add_many([row for row, ok in zip(rows, accepted) if ok])
+        return accepted
+
+class CsvStorage(SingleWriterStorage):
+
+    def __init__(self, data_file, journal=True, journal_limit=1024 * 1024, cache=True):
+        self.data_file = data_file
+        self.journal_file = data_file + ".journal" if journal else None
+        self.cache_file = data_file + ".cache" if cache else None
+        self.lock_file = data_file + ".lock"
+        self.journal_limit = journal_limit
+        self.journal_size = 0
+        self.bytes_written = 0
+        # Journal records carry the id of the instance that wrote them, so
+        # read_changes() can skip this instance's own changes.
+        self.origin = uuid.uuid4().hex[:12]
+        self.journal_offset = 0
+        self.journal_inode = None
+        self.snapshot_stat = None
+        # Changes from other instances that a compaction wrote into the
+        # snapshot before read_changes() reported them.
+        self.held = []
+
+    @property
+    def needs_compaction(self):
+        return self.journal_file is None or self.journal_size >= self.journal_limit
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def load(self):
+        # Both files are read under the lock, so a compaction cannot replace
+        # the snapshot and remove the journal in between.
+        with file_lock(self.lock_file):
+            self.snapshot_stat = self._stat(self.data_file)
+            columns = None
+            if os.path.exists(self.data_file):
+                columns = self._read_cache()
+                if columns is None:
+                    columns = self._parse_snapshot()
+                    self._write_cache(columns)
+
+            self.journal_size = 0
+            self.journal_offset = 0
+            self.journal_inode = None
+            self.held = []
+            journal = []
+            if self.journal_file and os.path.exists(self.journal_file):
+                journal = [(op, row) for op, row, _ in self._read_journal()]
+
+        if columns is not None:
+            for row in zip(*columns):
+                yield OP_ADD, row
+        yield from journal
+
+    def _parse_snapshot(self):
+        columns = ([], [], [], [], [], [])
+        appenders = [column.append for column in columns]
+        with open(self.data_file, "r", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 6:
+                    for append, value in zip(appenders, row):
+                        append(value)
+        return columns
+
+    def _read_cache(self):
+        # The cache holds the snapshot as six marshalled columns. It is used
+        # only while the CSV still has the size, mtime and hash it was built from.
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, "rb") as file:
+                version, size, mtime, digest, columns = marshal.loads(file.read())
+            stat = os.stat(self.data_file)
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+        if (version, size, mtime) != (CACHE_VERSION, stat.st_size, stat.st_mtime_ns):
+            return None
+        if digest != file_digest(self.data_file):
+            return None
+        return columns
+
+    def _write_cache(self, columns):
+        if not self.cache_file:
+            return
+        try:
+            stat = os.stat(self.data_file)
+            data = marshal.dumps((CACHE_VERSION, stat.st_size, stat.st_mtime_ns,
+                                  file_digest(self.data_file), tuple(columns)))
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, "wb") as file:
+                file.write(data)
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            # The cache only speeds up loading; the CSV stays authoritative.
+            pass
+
+    def _read_journal(self, offset=0):
+        with open(self.journal_file, "rb") as file:
+            self.journal_inode = os.fstat(file.fileno()).st_ino
+            file.seek(offset)
+            data = file.read()
+        self.journal_size = offset + len(data)
+
+        # A crash in the middle of an append leaves a torn last line; only
+        # records terminated by a newline are replayed. A line another
+        # instance is still writing is picked up by the next read.
+        data = data[:data.rfind(b"\n") + 1]
+        self.journal_offset = offset + len(data)
+        for row in csv.reader(data.decode("utf-8").splitlines()):
+            if len(row) >= 7 and row[0] == OP_ADD:
+                yield OP_ADD, row[1:7], row[7] if len(row) > 7 else None
+            elif len(row) >= 5 and row[0] == OP_CANCEL:
+                yield OP_CANCEL, row[1:5], row[5] if len(row) > 5 else None
+
+    def read_changes(self):
+        # Returns the changes other instances journaled since the last load or
+        # read, or None when the snapshot or journal was replaced and only a
+        # full load can catch up.
+        with file_lock(self.lock_file):
+            changes = self._unread_changes()
+        if changes is None:
+            self.held = []
+            return None
+        changes, self.held = self.held + changes, []
+        return changes
+
+    def _unread_changes(self):
+        if self._stat(self.data_file) != self.snapshot_stat:
+            return None
+        if not self.journal_file:
+            return []
+        journal = self._stat(self.journal_file)
+        if journal is None:
+            return [] if self.journal_offset == 0 else None
+        if (self.journal_inode is not None and journal[0] != self.journal_inode) or journal[1] < self.journal_offset:
+            return None
+        if journal[1] == self.journal_offset:
+            return []
+        return [(op, row) for op, row, origin in self._read_journal(self.journal_offset) if origin != self.origin]
+
+    def write_batch(self, changes):
+        if not self.journal_file or not changes:
+            return
+        with file_lock(self.lock_file), open(self.journal_file, "a", newline="", encoding="utf-8") as file:
+            start = file.tell()
+            csv.writer(file).writerows([op] + list(row) + [self.origin] for op, row in changes)
+            file.flush()
+            os.fsync(file.fileno())
+            self.journal_size = file.tell()
+        self.bytes_written += self.journal_size - start
+
+    def save(self, rows):
+        if not self.journal_file:
+            self._write_snapshot(rows)
+            return
+        with file_lock(self.lock_file, exclusive=True):
+            # Changes other instances journaled since this one last read them
+            # are not in rows; they go into the snapshot as well, and are held
+            # for read_changes() so this instance still applies them.
+            changes = self._unread_changes()
+            if changes is None:
+                # Another instance replaced the files, so rows are stale. The
+                # journal keeps every change until this instance reloads.
+                return False
+            held = self.held + changes
+            self._write_snapshot(self._merge(rows, held))
+            # The snapshot now holds every journaled change.
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self.held = held
+        self.journal_size = 0
+        self.journal_offset = 0
+        self.journal_inode = None
+        return True
+
+    def _merge(self, rows, changes):
+        added = []
+        cancelled = collections.Counter()
+        for op, row in changes:
+            if op == OP_ADD:
+                added.append(tuple(row))
+                continue
+            key = (date_key(row[0]), row[1], row[2], row[3])
+            for i, existing in enumerate(added):
+                if (date_key(existing[0]), existing[1], existing[2], existing[5]) == key:
+                    del added[i]
+                    break
+            else:
+                cancelled[key] += 1
+        for row in rows:
+            if cancelled:
+                key = (date_key(row[0]), row[1], row[2], row[5])
+                if cancelled[key]:
+                    cancelled[key] -= 1
+                    continue
+            yield row
+        yield from added
+
+    def _write_snapshot(self, rows):
+        columns = ([], [], [], [], [], []) if self.cache_file else None
+        if columns is not None:
+            rows = self._collect_columns(rows, columns)
+
+        temp_file = self.data_file + ".tmp"
+        with open(temp_file, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(HEADER)
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+            self.bytes_written += file.tell()
+        os.replace(temp_file, self.data_file)
+        fsync_directory(self.data_file)
+        if columns is not None:
+            self._write_cache(columns)
+        self.snapshot_stat = self._stat(self.data_file)
+
+    def _collect_columns(self, rows, columns):
+        appenders = [column.append for column in columns]
+        for row in rows:
+            for append, value in zip(appenders, row):
+                append(value)
+            yield row
+
+class SqliteStorage(Storage):
+
+    # Several kiosks may share the database, so capacity is checked inside
+    # the booking transaction rather than against the in-memory counters.
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            center TEXT NOT NULL,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            email TEXT NOT NULL,
+            email_folded TEXT NOT NULL,
+            day
+        );
+        CREATE INDEX IF NOT EXISTS appointments_email ON appointments (email_folded);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            center TEXT NOT NULL,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            email TEXT NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS appointments_added AFTER INSERT ON appointments BEGIN
+            INSERT INTO changes (op, date, time, center, name, phone, email)
+            VALUES ('A', NEW.date, NEW.time, NEW.center, NEW.name, NEW.phone, NEW.email);
+        END;
+        CREATE TRIGGER IF NOT EXISTS appointments_removed AFTER DELETE ON appointments BEGIN
+            INSERT INTO changes (op, date, time, center, name, phone, email)
+            VALUES ('C', OLD.date, OLD.time, OLD.center, OLD.name, OLD.phone, OLD.email);
+        END;
+    """
+
+    # Change log rows kept on close; an instance further behind than this
+    # reloads everything instead.
+    CHANGES_KEPT = 100000
+
+    def __init__(self, data_file, timeout=30.0):
+        import sqlite3
+
+        self.data_file = data_file
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(data_file, timeout=timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        self._add_day_column()
+        self.change_seq = 0
+        self.own_changes = []
+
+    def _add_day_column(self):
+        # Slots are matched on day, the date_key() of the date, so one day
+        # written in two formats is still one slot. Databases created before
+        # the column existed get it filled in once.
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(appointments)")]
+        if "day" not in columns:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.execute("ALTER TABLE appointments ADD COLUMN day")
+                self.connection.executemany("UPDATE appointments SET day = ? WHERE id = ?",
+                                            [(date_key(date), row_id) for row_id, date in
+                                             self.connection.execute("SELECT id, date FROM appointments")])
+                self.connection.execute("DROP INDEX IF EXISTS appointments_slot")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS appointments_day ON appointments (day, center, time)")
+
+    def load(self):
+        with self.lock:
+            # One read transaction, so the change log position matches the rows.
+            self.connection.execute("BEGIN")
+            try:
+                self.change_seq = self._last_change()
+                rows = self.connection.execute(
+                    "SELECT date, time, center, name, phone, email FROM appointments ORDER BY id").fetchall()
+            finally:
+                self.connection.execute("COMMIT")
+            self.own_changes = []
+        for row in rows:
+            yield OP_ADD, list(row)
+
+    def _last_change(self):
+        return self.connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def _begin(self):
+        # Writes take the write lock first, so the change log entries made
+        # between _begin and _commit are known to be this instance's own.
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self._last_change()
+
+    def _commit(self, first):
+        last = self._last_change()
+        self.connection.execute("COMMIT")
+        if last > first:
+            self.own_changes.append((first, last))
+
+    def read_changes(self):
+        with self.lock:
+            oldest = self.connection.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            if oldest is not None and oldest > self.change_seq + 1:
+                return None
+            rows = self.connection.execute(
+                "SELECT seq, op, date, time, center, name, phone, email FROM changes WHERE seq > ? ORDER BY seq",
+                (self.change_seq,)).fetchall()
+            if not rows:
+                return []
+            self.change_seq = rows[-1][0]
+            own = self.own_changes
+            self.own_changes = [(first, last) for first, last in own if last > self.change_seq]
+
+        changes = []
+        for seq, op, date, time, center, name, phone, email in rows:
+            if any(first < seq <= last for first, last in own):
+                continue
+            if op == OP_ADD:
+                changes.append((OP_ADD, [date, time, center, name, phone, email]))
+            else:
+                changes.append((OP_CANCEL, [date, time, center, email]))
+        return changes
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM appointments").fetchone()[0]
+
+    def _insert(self, row):
+        self.connection.execute(
+            "INSERT INTO appointments (date, time, center, name, phone, email, email_folded, day) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (*row, row[5].casefold(), date_key(row[0])))
+
+    def write_batch(self, changes):
+        with self.lock:
+            first = self._begin()
+            try:
+                for op, row in changes:
+                    if op == OP_ADD:
+                        self._insert(row)
+                    else:
+                        self._delete(row)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self._commit(first)
+
+    def book(self, row, capacity, booked=None):
+        date, time, center = row[:3]
+        with self.lock:
+            # BEGIN IMMEDIATE takes the write lock before counting, so no other
+            # process can book the slot between the check and the insert.
+            first = self._begin()
+            try:
+                (count,) = self.connection.execute(
+                    "SELECT COUNT(*) FROM appointments WHERE day = ? AND center = ? AND time = ?",
+                    (date_key(date), center, time)).fetchone()
+                if count >= capacity:
+                    self.connection.execute("ROLLBACK")
+                    return False
+                self._insert(row)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self._commit(first)
+        return True
+
+    def book_many(self, rows, capacities, booked=None):
+        with self.lock:
+            first = self._begin()
+            try:
+                counts = {}
+                slots = [(date_key(row[0]), row[1], row[2]) for row in rows]
+                for slot in slots:
+                    if slot not in counts:
+                        counts[slot] = self.connection.execute(
+                            "SELECT COUNT(*) FROM appointments WHERE day = ? AND time = ? AND center = ?",
+                            slot).fetchone()[0]
+                accepted = within_capacity(rows, capacities, [counts[slot] for slot in slots])
+                for row, ok in zip(rows, accepted):
+                    if ok:
+                        self._insert(row)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self._commit(first)
+        return accepted
+
+    def _delete(self, row):
+        cursor = self.connection.execute(
+            "DELETE FROM appointments WHERE id = (SELECT id FROM appointments "
+            "WHERE day = ? AND time = ? AND center = ? AND email = ? ORDER BY id LIMIT 1)",
+            (date_key(row[0]), *row[1:4]))
+        return cursor.rowcount > 0
+
+    def cancel(self, row):
+        with self.lock:
+            first = self._begin()
+            try:
+                removed = self._delete(row)
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self._commit(first)
+        return removed
+
+    def save(self, rows):
+        # Every change is committed as it happens.
+        pass
+
+    def close(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM changes WHERE seq <= ?", (self._last_change() - self.CHANGES_KEPT,))
+            self.connection.close()
+
+class PartitionedStorage(SingleWriterStorage):
+
+    # One CSV per month under data_dir, so a change only touches its own
+    # month. Months that ended more than archive_days ago are moved to
+    # archive/YYYY-MM.csv.gz, which load() skips. Partition files are
+    # rewritten in place and carry no change log, so read_changes() never
+    # reports other instances' changes.
+
+    def __init__(self, data_dir, archive_days=90):
+        self.data_dir = data_dir
+        self.archive_dir = os.path.join(data_dir, "archive")
+        self.archive_days = archive_days
+        self.bytes_written = 0
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    def partition_name(self, date):
+        try:
+            return parse_date(date).strftime("%Y-%m")
+        except ValueError:
+            return "undated"
+
+    def partition_file(self, name):
+        return os.path.join(self.data_dir, f"{name}.csv")
+
+    def archive_file(self, name):
+        return os.path.join(self.archive_dir, f"{name}.csv.gz")
+
+    def partitions(self):
+        return sorted(entry[:-4] for entry in os.listdir(self.data_dir) if entry.endswith(".csv"))
+
+    def archived_partitions(self):
+        return sorted(entry[:-7] for entry in os.listdir(self.archive_dir) if entry.endswith(".csv.gz"))
+
+    def archive_cutoff(self):
+        cutoff = datetime.date.today() - datetime.timedelta(days=self.archive_days)
+        return cutoff.strftime("%Y-%m")
+
+    def _read_rows(self, file):
+        reader = csv.reader(file)
+        next(reader, None)
+        return [row[:6] for row in reader if len(row) >= 6]
+
+    def read_partition(self, name):
+        path = self.partition_file(name)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", newline="", encoding="utf-8") as file:
+            return self._read_rows(file)
+
+    def read_archive(self, name):
+        path = self.archive_file(name)
+        if not os.path.exists(path):
+            return []
+        with gzip.open(path, "rt", newline="", encoding="utf-8") as file:
+            return self._read_rows(file)
+
+    def _replace(self, path, rows, compress=False):
+        temp_file = path + ".tmp"
+        opener = gzip.open if compress else open
+        with opener(temp_file, "wt", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(HEADER)
+            writer.writerows(rows)
+        with open(temp_file, "rb+") as file:
+            os.fsync(file.fileno())
+            self.bytes_written += os.fstat(file.fileno()).st_size
+        os.replace(temp_file, path)
+        fsync_directory(path)
+
+    def archive_old_partitions(self):
+        cutoff = self.archive_cutoff()
+        archived = []
+        for name in self.partitions():
+            # Strictly older months only; "undated" sorts after every month.
+            if name >= cutoff:
+                continue
+            self._replace(self.archive_file(name), self.read_archive(name) + self.read_partition(name), compress=True)
+            os.remove(self.partition_file(name))
+            archived.append(name)
+        return archived
+
+    def load(self):
+        self.archive_old_partitions()
+        for name in self.partitions():
+            for row in self.read_partition(name):
+                yield OP_ADD, row
+
+    def load_archive(self):
+        for name in self.archived_partitions():
+            for row in self.read_archive(name):
+                yield OP_ADD, row
+
+    def write_batch(self, changes):
+        by_partition = {}
+        for op, row in changes:
+            by_partition.setdefault(self.partition_name(row[0]), []).append((op, row))
+
+        for name, partition_changes in by_partition.items():
+            if all(op == OP_ADD for op, _ in partition_changes):
+                self._append(name, [row for _, row in partition_changes])
+            else:
+                self._rewrite(name, partition_changes)
+
+    def _append(self, name, rows):
+        path = self.partition_file(name)
+        is_new = not os.path.exists(path)
+        with open(path, "a", newline="", encoding="utf-8") as file:
+            start = file.tell()
+            writer = csv.writer(file)
+            if is_new:
+                writer.writerow(HEADER)
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+            self.bytes_written += file.tell() - start
+
+    def _rewrite(self, name, changes):
+        # A cancel rewrites its month only. Changes aimed at an archived
+        # month are applied to the archive file instead.
+        archived = not os.path.exists(self.partition_file(name)) and os.path.exists(self.archive_file(name))
+        rows = self.read_archive(name) if archived else self.read_partition(name)
+        for op, row in changes:
+            if op == OP_ADD:
+                rows.append(list(row))
+                continue
+            key = (date_key(row[0]), row[1], row[2], row[3])
+            for i, existing in enumerate(rows):
+                if (date_key(existing[0]), existing[1], existing[2], existing[5]) == key:
+                    del rows[i]
+                    break
+        if archived:
+            self._replace(self.archive_file(name), rows, compress=True)
+        else:
+            self._replace(self.partition_file(name), rows)
+
+    def save(self, rows):
+        # Every change is already in its partition; saving only archives.
+        self.archive_old_partitions()
+
+class ArchiveStorage(Storage):
+
+    # Presents another storage's archive as its current data, so archived
+    # records can be indexed apart from everything else. Read-only.
+    def __init__(self, storage):
+        self.storage = storage
+
+    def load(self):
+        return self.storage.load_archive()
+
+class BatchedStorage(SingleWriterStorage):
+
+    # Buffers changes in memory so a caller can write many of them with one
+    # journal append or one transaction. The owner of the DataManager must be
+    # the only writer, because capacity is checked against memory.
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.pending = []
+
+    @property
+    def bytes_written(self):
+        return getattr(self.storage, "bytes_written", 0)
+
+    def load(self):
+        return self.storage.load()
+
+    def load_archive(self):
+        return self.storage.load_archive()
+
+    def write_batch(self, changes):
+        self.pending.extend((op, tuple(row)) for op, row in changes)
+
+    def read_changes(self):
+        return self.storage.read_changes()
+
+    def take_pending(self):
+        changes, self.pending = self.pending, []
+        return changes
+
+    def requeue(self, changes):
+        self.pending[:0] = changes
+
+    def flush(self):
+        changes = self.take_pending()
+        try:
+            self.storage.write_batch(changes)
+        except BaseException:
+            self.requeue(changes)
+            raise
+
+    def save(self, rows):
+        self.flush()
+        self.storage.save(rows)
+
+    def close(self):
+        self.flush()
+        self.storage.close()
+
+class BackgroundStorage(SingleWriterStorage):
+
+    # Hands every write to one worker thread so the caller never waits on the
+    # disk. Whatever is queued while a write runs goes out together in the
+    # next one, in the order it was queued. Like BatchedStorage, this is for a
+    # single writer that checks capacity against memory.
+    def __init__(self, storage, on_error=None):
+        self.storage = storage
+        self.on_error = on_error
+        self.queue = []
+        self.busy = False
+        self.saving = False
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.worker = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self.worker.start()
+
+    @property
+    def bytes_written(self):
+        return getattr(self.storage, "bytes_written", 0)
+
+    @property
+    def needs_compaction(self):
+        if self.saving or any(op is None for op, _ in self.queue):
+            return False
+        return self.storage.needs_compaction
+
+    def load(self):
+        self.flush()
+        return self.storage.load()
+
+    def load_archive(self):
+        self.flush()
+        return self.storage.load_archive()
+
+    def read_changes(self):
+        # Holding the lock while the worker is idle keeps a snapshot or
+        # journal write from running while the change log is read.
+        with self.condition:
+            if self.busy or self.queue:
+                return []
+            return self.storage.read_changes()
+
+    def _put(self, entries):
+        with self.condition:
+            self.queue.extend(entries)
+            # New work also retries anything left over from a failed write.
+            self.error = None
+            self.condition.notify_all()
+
+    def write_batch(self, changes):
+        self._put([(op, tuple(row)) for op, row in changes])
+
+    def save(self, rows):
+        # Rows are copied here, on the caller's thread, because they usually
+        # come straight from the in-memory index.
+        self._put([(None, [tuple(row) for row in rows])])
+
+    def _segments(self, entries):
+        # Only the newest snapshot is worth writing; changes on either side
+        # of it keep their order.
+        last_save = max((i for i, (op, _) in enumerate(entries) if op is None), default=-1)
+        segments = []
+        for i, (op, payload) in enumerate(entries):
+            if op is None:
+                if i == last_save:
+                    segments.append((None, payload))
+            elif segments and segments[-1][0] is not None:
+                segments[-1][1].append((op, payload))
+            else:
+                segments.append(("batch", [(op, payload)]))
+        return segments
+
+    def _write(self, segments):
+        for index, (kind, payload) in enumerate(segments):
+            try:
+                if kind is None:
+                    self.saving = True
+                    self.storage.save(payload)
+                else:
+                    self.storage.write_batch(payload)
+            except Exception as error:
+                return index, error
+            finally:
+                self.saving = False
+        return None, None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.queue or self.error is not None):
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                entries, self.queue = self.queue, []
+                self.busy = True
+
+            segments = self._segments(entries)
+            failed, error = self._write(segments)
+
+            with self.condition:
+                self.busy = False
+                if error is not None:
+                    # Unwritten entries go back to the front of the queue and
+                    # wait for the next change or flush() to try again.
+                    self.queue[:0] = [entry for kind, payload in segments[failed:]
+                                      for entry in ([(None, payload)] if kind is None else payload)]
+                    self.error = error
+                self.condition.notify_all()
+            if error is not None and self.on_error is not None:
+                self.on_error(error)
+
+    def flush(self):
+        with self.condition:
+            self.error = None
+            self.condition.notify_all()
+            while (self.queue or self.busy) and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.worker.join()
+        self.storage.close()
@@ -0,0 +1,72 @@
+def appointment_rows(appointments):
+    # The record's identity is a stable item id while the record is in
+    # memory; values are compared too, in case an id is reused.
+    return [(str(id(person)), (date, time, center, person["name"], person["phone"], person["email"]))
+            for date, time, center, person in appointments]
+
+class VirtualTreeView:
+
+    # Keeps the full result list in Python and inserts only as many rows into
+    # the Treeview as the user has scrolled to; later updates are applied as
+    # diffs against what is already shown.
+
+    def __init__(self, tree, scrollbar, page_size=200):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.page_size = page_size
+        self.rows = []
+        self.rendered = 0
+        self.more_pending = False
+        tree.configure(yscrollcommand=self.on_scroll)
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= 0.9 and self.rendered < len(self.rows) and not self.more_pending:
+            self.more_pending = True
+            self.tree.after_idle(self.render_more)
+
+    def render_more(self):
+        self.more_pending = False
+        end = min(self.rendered + self.page_size, len(self.rows))
+        for iid, values in self.rows[self.rendered:end]:
+            self.tree.insert("", "end", iid=iid, values=values)
+        self.rendered = end
+
+    def reset(self, rows):
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.rows = list(rows)
+        self.rendered = 0
+        self.render_more()
+
+    def update(self, rows):
+        rows = list(rows)
+        shown = {iid: values for iid, values in self.rows[:self.rendered]}
+        new_ids = {iid for iid, _ in rows}
+        removed = [iid for iid in shown if iid not in new_ids]
+        if removed:
+            self.tree.delete(*removed)
+
+        # The Treeview always holds a prefix of self.rows in order, so a new
+        # row's list position is also its Treeview index.
+        still_shown = len(shown) - len(removed)
+        target = min(max(self.rendered, self.page_size), len(rows))
+        position = 0
+        for iid, values in rows:
+            if position >= target and still_shown == 0:
+                break
+            if iid in shown:
+                still_shown -= 1
+                if shown[iid] != values:
+                    self.tree.delete(iid)
+                    self.tree.insert("", position, iid=iid, values=values)
+            else:
+                self.tree.insert("", position, iid=iid, values=values)
+            position += 1
+
+        self.rows = rows
+        self.rendered = position
+
+    def __len__(self):
+        return len(self.rows)
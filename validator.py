@@ -1,63 +1,115 @@
 import re
 
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PUNCTUATION = str.maketrans("", "", "-().")
+NAME_PUNCTUATION = str.maketrans("", "", ".-'")
+# The batch fast path also drops ASCII whitespace in the same pass; any other
+# whitespace fails the fast check and goes through the full rules.
+PHONE_SEPARATORS = str.maketrans("", "", "-(). \t\n\r\x0b\x0c")
+NAME_SEPARATORS = str.maketrans("", "", ".-' \t\n\r\x0b\x0c")
+
+def _name_error(name):
+    if not name:
+        return "Name cannot be empty"
+
+    if len(name) < 2:
+        return "Name is too short"
+
+    # Same rule as checking each character for isalpha/isspace/".-'", but the
+    # scan runs in C: drop punctuation and whitespace, then test the rest.
+    letters = "".join(name.translate(NAME_PUNCTUATION).split())
+    if letters and not letters.isalpha():
+        return "Name contains invalid characters"
+
+    return None
+
+def _phone_error(phone):
+    if not phone:
+        return "Phone number cannot be empty"
+
+    cleaned_phone = "".join(phone.translate(PHONE_PUNCTUATION).split())
+
+    if not cleaned_phone.isdigit():
+        return "Phone number should contain only digits, spaces, and common separators"
+
+    if len(cleaned_phone) < 10:
+        return "Phone number is too short"
+
+    return None
+
+def _email_error(email):
+    if not email:
+        return "Email cannot be empty"
+
+    if not EMAIL_PATTERN.match(email):
+        return "Invalid email format"
+
+    return None
+
+def _validate_chunk(records):
+    # A row passes the fast check only if it passes every rule: at least two
+    # letters, ten digits and a matching email imply a valid form. Rows that
+    # fail it go through the helpers, which name the errors.
+    results = []
+    append = results.append
+    match_email = EMAIL_PATTERN.match
+    for name, phone, email in records:
+        letters = name.translate(NAME_SEPARATORS)
+        digits = phone.translate(PHONE_SEPARATORS)
+        if len(letters) >= 2 and letters.isalpha() and len(digits) >= 10 and digits.isdigit() and match_email(email):
+            append((True, []))
+            continue
+        errors = [error for error in (_name_error(name.strip()), _phone_error(phone.strip()),
+                                      _email_error(email.strip())) if error]
+        append((not errors, errors))
+    return results
+
 class InputValidator:
-    
+
     @staticmethod
     def validate_name(name):
-        name = name.strip()
-        if not name:
-            return (False, "Name cannot be empty")
-        
-        if len(name) < 2:
-            return (False, "Name is too short")
-            
-        if not all(c.isalpha() or c.isspace() or c in ".-'" for c in name):
-            return (False, "Name contains invalid characters")
-            
-        return (True, "")
-    
+        error = _name_error(name.strip())
+        return (False, error) if error else (True, "")
+
     @staticmethod
     def validate_phone(phone):
-        phone = phone.strip()
-        if not phone:
-            return (False, "Phone number cannot be empty")
-        
-        cleaned_phone = re.sub(r'[\s\-\(\)\.]+', '', phone)
-        
-        if not cleaned_phone.isdigit():
-            return (False, "Phone number should contain only digits, spaces, and common separators")
-            
-        if len(cleaned_phone) < 10:
-            return (False, "Phone number is too short")
-            
-        return (True, "")
-    
+        error = _phone_error(phone.strip())
+        return (False, error) if error else (True, "")
+
     @staticmethod
     def validate_email(email):
-        email = email.strip()
-        if not email:
-            return (False, "Email cannot be empty")
-        
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, email):
-            return (False, "Invalid email format")
-            
-        return (True, "")
-        
+        error = _email_error(email.strip())
+        return (False, error) if error else (True, "")
+
     @staticmethod
     def validate_appointment_form(name, phone, email):
         errors = []
-        
+
         name_valid, name_error = InputValidator.validate_name(name)
         if not name_valid:
             errors.append(name_error)
-            
+
         phone_valid, phone_error = InputValidator.validate_phone(phone)
         if not phone_valid:
             errors.append(phone_error)
-            
+
         email_valid, email_error = InputValidator.validate_email(email)
         if not email_valid:
             errors.append(email_error)
-            
-        return (len(errors) == 0, errors)
\ No newline at end of file
+
+        return (len(errors) == 0, errors)
+
+    @staticmethod
+    def validate_many(records, processes=None, chunk_size=50000):
+        records = [(name, phone, email) for name, phone, email in records]
+        if not processes or processes < 2 or len(records) <= chunk_size:
+            return _validate_chunk(records)
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+        results = []
+        with ProcessPoolExecutor(processes) as pool:
+            for chunk_results in pool.map(_validate_chunk, chunks):
+                results.extend(chunk_results)
+        return results